@@ -0,0 +1,236 @@
+from numba import njit, i4, i8, u8
+import numpy as np
+
+import game.bitboard as bitop
+import game.codec as codec
+import game.hashing as hashing
+from game.hashing import TranspositionTable
+import engines.endgame as endgame
+from engines.budget import Budget
+
+
+search_depth = 10
+aspiration_window = 50
+tt_size_log2 = 20
+
+MAX_PLY = 128
+PASS = 64
+INF = 30000
+
+# Finished games score far outside the heuristic range, ordered by the final
+# disk differential.
+WIN_SCORE = 10000
+DISK_SCORE = 100
+
+W_MOBILITY = 10
+W_CORNER = 40
+W_FRONTIER = 4
+W_STABLE = 20
+
+CORNERS = np.uint64(0x8100000000000081)
+
+# Search statistics shared between the driver and the kernels.
+NODES = 0
+NODE_LIMIT = 1
+ABORTED = 2
+NUM_STATS = 3
+
+
+@njit('i4(u8, u8, u8)')
+def evaluate(my, opp, obs):
+    """Heuristic score for the player to move, from mobility, corners,
+    frontier disks (disks next to an empty cell) and stable disks."""
+    my_moves = np.int32(bitop.popcount(bitop.generate_moves_kogge_stone(my, opp, obs)))
+    opp_moves = np.int32(bitop.popcount(bitop.generate_moves_kogge_stone(opp, my, obs)))
+    frontier = bitop.neighbours(~(my | opp | obs))
+
+    score = W_MOBILITY * (my_moves - opp_moves)
+    score += W_CORNER * (np.int32(bitop.popcount(my & CORNERS)) - np.int32(bitop.popcount(opp & CORNERS)))
+    score -= W_FRONTIER * (np.int32(bitop.popcount(my & frontier)) - np.int32(bitop.popcount(opp & frontier)))
+    score += W_STABLE * (np.int32(bitop.popcount(bitop.stable_disks(my, opp, obs)))
+                         - np.int32(bitop.popcount(bitop.stable_disks(opp, my, obs))))
+    return score
+
+
+@njit('i4(u8, u8, u8)')
+def final_score(my, opp, obs):
+    diff = bitop.evaluate(my, opp, obs)
+    if diff > 0:
+        return WIN_SCORE + DISK_SCORE * diff
+    elif diff < 0:
+        return -WIN_SCORE + DISK_SCORE * diff
+    return 0
+
+
+@njit('i4[:](u8, i4, i4, i4, i4[:, ::1], i8[:, ::1])')
+def order_moves(moves, tt_move, ply, turn, killers, history):
+    idx = bitop.bit_indices(moves)
+    keys = np.empty(len(idx), dtype=np.int64)
+
+    for n in range(len(idx)):
+        i = idx[n]
+        if i == tt_move:
+            keys[n] = 1 << 62
+        elif i == killers[ply, 0]:
+            keys[n] = 1 << 61
+        elif i == killers[ply, 1]:
+            keys[n] = 1 << 60
+        else:
+            keys[n] = history[turn, i]
+
+    return idx[np.argsort(-keys, kind='mergesort')]
+
+
+@njit(i4(u8, u8, u8, u8, i4, i4, i4, i4, i4, i4,
+         TranspositionTable.class_type.instance_type, i4[:, ::1], i8[:, ::1], i8[::1]))
+def pvs(my, opp, obs, key, turn, depth, alpha, beta, passed, ply, tt, killers, history, stats):
+    """Principal variation search. Scores are from the point of view of the
+    player to move; turn (0 or 1) only keys the hash and history tables."""
+    if stats[ABORTED]:
+        return 0
+    stats[NODES] += 1
+    if stats[NODE_LIMIT] and stats[NODES] >= stats[NODE_LIMIT]:
+        stats[ABORTED] = 1
+        return 0
+
+    moves = bitop.generate_moves_kogge_stone(my, opp, obs)
+
+    if not moves:
+        if passed:
+            return final_score(my, opp, obs)
+        key = hashing.hash_move(key, turn, PASS, 0)
+        return -pvs(opp, my, obs, key, turn ^ 1, depth, -beta, -alpha, 1,
+                    ply + 1, tt, killers, history, stats)
+
+    if depth <= 0 or ply >= MAX_PLY - 1:
+        return evaluate(my, opp, obs)
+
+    alpha_orig = alpha
+    found, tt_value, tt_depth, tt_flag, tt_move = tt.probe(key)
+
+    if found and tt_depth >= depth:
+        if tt_flag == hashing.EXACT:
+            return tt_value
+        elif tt_flag == hashing.LOWER:
+            alpha = max(alpha, tt_value)
+        else:
+            beta = min(beta, tt_value)
+        if alpha >= beta:
+            return tt_value
+
+    if not found:
+        tt_move = PASS
+
+    best, best_move = -INF, PASS
+    for n, i in enumerate(order_moves(moves, tt_move, ply, turn, killers, history)):
+        new_my, new_opp = bitop.resolve_move_kogge_stone(my, opp, i)
+        new_key = hashing.hash_move(key, turn, i, opp ^ new_opp)
+
+        if n == 0:
+            score = -pvs(new_opp, new_my, obs, new_key, turn ^ 1, depth - 1, -beta, -alpha, 0,
+                         ply + 1, tt, killers, history, stats)
+        else:
+            score = -pvs(new_opp, new_my, obs, new_key, turn ^ 1, depth - 1, -alpha - 1, -alpha, 0,
+                         ply + 1, tt, killers, history, stats)
+            if alpha < score < beta:
+                score = -pvs(new_opp, new_my, obs, new_key, turn ^ 1, depth - 1, -beta, -alpha, 0,
+                             ply + 1, tt, killers, history, stats)
+
+        if score > best:
+            best, best_move = score, i
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    if killers[ply, 0] != i:
+                        killers[ply, 1] = killers[ply, 0]
+                        killers[ply, 0] = i
+                    history[turn, i] += depth * depth
+                    break
+
+    if stats[ABORTED]:
+        return best
+
+    if best <= alpha_orig:
+        flag = hashing.UPPER
+    elif best >= beta:
+        flag = hashing.LOWER
+    else:
+        flag = hashing.EXACT
+    tt.store(key, best, depth, flag, best_move)
+
+    return best
+
+
+tt = TranspositionTable(tt_size_log2)
+killers = np.full((MAX_PLY, 2), PASS, dtype=np.int32)
+history = np.zeros((2, 8 * 8), dtype=np.int64)
+
+
+def search(my, opp, obs, max_depth=None, budget=None):
+    """Iterative deepening with aspiration windows. Returns the best move,
+    its score and the last completed depth.
+
+    The budget counts nodes. A time limit is turned into a node limit for
+    each iteration from the node rate measured so far, so an iteration that
+    would overrun the deadline is cut off inside the compiled search."""
+    max_depth = search_depth if max_depth is None else max_depth
+    budget = Budget() if budget is None else budget
+
+    tt.new_search()
+    killers[:] = PASS
+    history[:] = 0
+
+    my, opp, obs = np.uint64(my), np.uint64(opp), np.uint64(obs)
+    key = np.uint64(hashing.hash_position(my, opp, obs, 0))
+    stats = np.zeros(NUM_STATS, dtype=np.int64)
+
+    moves = bitop.generate_moves(my, opp, obs)
+    best_move = bitop.bit_index(moves) if moves else PASS
+    score, completed = 0, 0
+
+    for depth in range(1, max_depth + 1):
+        if budget.exhausted() or bitop.popcount(moves) < 2:
+            break
+
+        remaining = budget.remaining()
+        stats[NODE_LIMIT] = 0 if remaining == float('inf') or depth == 1 else stats[NODES] + max(1, int(remaining))
+
+        if depth > 1:
+            alpha, beta = score - aspiration_window, score + aspiration_window
+        else:
+            alpha, beta = -INF, INF
+
+        value = pvs(my, opp, obs, key, 0, depth, alpha, beta, 0, 0, tt, killers, history, stats)
+        if not stats[ABORTED] and not alpha < value < beta:
+            value = pvs(my, opp, obs, key, 0, depth, -INF, INF, 0, 0, tt, killers, history, stats)
+
+        budget.done = int(stats[NODES])
+        if stats[ABORTED]:
+            break
+
+        found, _, _, _, move = tt.probe(key)
+        if found and move != PASS:
+            best_move = move
+        score, completed = value, depth
+
+        # Stop once the result is exact: a proven win or loss, or a search
+        # that reached the end of the game.
+        if abs(score) >= WIN_SCORE or depth >= endgame.count_empty(my, opp, obs):
+            break
+
+    return best_move, score, completed
+
+
+# Compile the table methods search() calls from Python now, so that the first
+# timed search does not spend its budget on them.
+search(codec.INITIAL_MY, codec.INITIAL_OPP, 0, max_depth=1)
+
+
+def run(my, opp, obs, budget=None):
+    if endgame.count_empty(my, opp, obs) <= endgame.empty_threshold:
+        move = endgame.run(my, opp, obs, budget)
+        if move is not None:
+            return move
+
+    move, _, _ = search(my, opp, obs, budget=budget)
+    return move
@@ -0,0 +1,39 @@
+import time
+
+
+class Budget:
+    """Limits for an anytime search: a number of simulations (nodes, for
+    alpha-beta), a wall-clock time limit in seconds, or both. The search
+    stops at whichever runs out first and records in `done` how many
+    simulations it ran."""
+
+    def __init__(self, simulations=None, time_limit=None):
+        self.simulations = simulations
+        self.time_limit = time_limit
+        self.start = time.perf_counter()
+        self.done = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def exhausted(self):
+        if self.simulations is not None and self.done >= self.simulations:
+            return True
+        if self.time_limit is not None and self.elapsed() >= self.time_limit:
+            return True
+        return False
+
+    def remaining(self):
+        """Estimate of how many more simulations fit in the budget, assuming
+        the rate so far holds."""
+        left = float('inf')
+        if self.simulations is not None:
+            left = self.simulations - self.done
+        if self.time_limit is not None:
+            elapsed = self.elapsed()
+            rate = self.done / elapsed if elapsed > 0 else float('inf')
+            left = min(left, rate * max(0.0, self.time_limit - elapsed))
+        return left
+
+    def __repr__(self):
+        return f'Budget(done={self.done}, elapsed={self.elapsed():.3f}s)'
@@ -0,0 +1,186 @@
+from numba import njit
+import numpy as np
+import time
+import game.bitboard as bitop
+
+
+# Other engines hand over to the solver at or below this many empty squares.
+empty_threshold = 16
+
+# Above this many empty squares moves are sorted fastest-first; below it the
+# sort costs more than it saves, and only parity ordering is used.
+ORDERING_DEPTH = 6
+
+PASS = 64
+
+MAX_SCORE = 8 * 8
+
+# Search statistics shared between run() and the kernels, as in
+# engines.alphabeta: nodes searched, the node limit (0 for none) and whether
+# the limit cut the search off.
+NODES = 0
+NODE_LIMIT = 1
+ABORTED = 2
+NUM_STATS = 3
+
+# Estimate of the solver's speed in counted nodes per second, used to turn a
+# time limit into a node limit. It is updated from every timed solve.
+node_rate = 1e5
+
+QUADRANTS = np.array([
+    0x000000000F0F0F0F,
+    0x00000000F0F0F0F0,
+    0x0F0F0F0F00000000,
+    0xF0F0F0F000000000,
+], dtype=np.uint64)
+
+
+@njit('u8(u8)')
+def odd_regions(empty_cells):
+    """Quadrants holding an odd number of empty cells. Playing into these
+    first tends to leave the opponent the last move in even regions."""
+    res = np.uint64(0)
+    for q in QUADRANTS:
+        if bitop.popcount(empty_cells & q) & 1:
+            res |= q
+    return res
+
+
+@njit('i4(u8, u8, u8)')
+def count_empty(my, opp, obs):
+    return bitop.popcount(~(my | opp | obs))
+
+
+@njit('i4(u8, u8, u8, i4, i4, i4)')
+def negamax_parity(my, opp, obs, alpha, beta, passed):
+    """negamax for at most ORDERING_DEPTH empty squares, with parity
+    ordering only. These small subtrees make up most of the nodes, so they
+    are neither counted nor cut off."""
+    moves = bitop.generate_moves_kogge_stone(my, opp, obs)
+
+    if not moves:
+        if passed:
+            return bitop.evaluate(my, opp, obs)
+        return -negamax_parity(opp, my, obs, -beta, -alpha, 1)
+
+    odd = odd_regions(~(my | opp | obs))
+    best = -MAX_SCORE - 1
+
+    for remaining in (moves & odd, moves & ~odd):
+        while remaining:
+            i, remaining = bitop.pop_lowest(remaining)
+            new_my, new_opp = bitop.resolve_move_kogge_stone(my, opp, i)
+            score = -negamax_parity(new_opp, new_my, obs, -beta, -alpha, 0)
+
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        return best
+    return best
+
+
+@njit('i4(u8, u8, u8, i4, i4, i4, i8[::1])')
+def negamax(my, opp, obs, alpha, beta, passed, stats):
+    """Exact final disk differential for the player to move, within the
+    (alpha, beta) window. Nodes above ORDERING_DEPTH empty squares are
+    counted in stats; once stats[NODE_LIMIT] of them have been searched the
+    search is cut off and the score is meaningless."""
+    empty_cells = ~(my | opp | obs)
+    if bitop.popcount(empty_cells) <= ORDERING_DEPTH:
+        return negamax_parity(my, opp, obs, alpha, beta, passed)
+
+    if stats[ABORTED]:
+        return 0
+    if stats[NODE_LIMIT] and stats[NODES] >= stats[NODE_LIMIT]:
+        stats[ABORTED] = 1
+        return 0
+    stats[NODES] += 1
+
+    moves = bitop.generate_moves_kogge_stone(my, opp, obs)
+
+    if not moves:
+        if passed:
+            return bitop.evaluate(my, opp, obs)
+        return -negamax(opp, my, obs, -beta, -alpha, 1, stats)
+
+    # Stability cutoff: the opponent keeps its stable disks, which caps how
+    # many disks this player can finish with.
+    upper = MAX_SCORE - bitop.popcount(obs) - 2 * bitop.popcount(bitop.stable_disks(opp, my, obs))
+    if upper <= alpha:
+        return upper
+
+    # Fastest-first: search replies that leave the opponent the fewest moves
+    # first, breaking ties by parity.
+    odd = odd_regions(empty_cells)
+    idx = bitop.bit_indices(moves)
+    keys = np.empty(len(idx), dtype=np.int32)
+    for n in range(len(idx)):
+        new_my, new_opp = bitop.resolve_move_kogge_stone(my, opp, idx[n])
+        mobility = bitop.popcount(bitop.generate_moves_kogge_stone(new_opp, new_my, obs))
+        keys[n] = 2 * mobility + (0 if odd & (np.uint64(1) << np.uint64(idx[n])) else 1)
+
+    best = -MAX_SCORE - 1
+    for n in np.argsort(keys, kind='mergesort'):
+        new_my, new_opp = bitop.resolve_move_kogge_stone(my, opp, idx[n])
+        score = -negamax(new_opp, new_my, obs, -beta, -alpha, 0, stats)
+
+        if score > best:
+            best = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return best
+
+
+@njit('Tuple((i4, i4))(u8, u8, u8, i8[::1])')
+def solve_limited(my, opp, obs, stats):
+    """Best move and exact final disk differential for the player to move,
+    unless stats[ABORTED] is set on return."""
+    moves = bitop.generate_moves_kogge_stone(my, opp, obs)
+
+    if not moves:
+        return PASS, negamax(my, opp, obs, -MAX_SCORE - 1, MAX_SCORE + 1, 0, stats)
+
+    best_move, best = PASS, -MAX_SCORE - 1
+    while moves:
+        i, moves = bitop.pop_lowest(moves)
+        new_my, new_opp = bitop.resolve_move_kogge_stone(my, opp, i)
+        score = -negamax(new_opp, new_my, obs, -MAX_SCORE - 1, -best, 0, stats)
+
+        if score > best:
+            best_move, best = i, score
+
+    return best_move, best
+
+
+@njit('Tuple((i4, i4))(u8, u8, u8)')
+def solve(my, opp, obs):
+    """Best move and exact final disk differential for the player to move."""
+    return solve_limited(my, opp, obs, np.zeros(NUM_STATS, dtype=np.int64))
+
+
+def run(my, opp, obs, budget=None):
+    """Exact best move, or None if the budget's time limit runs out first, in
+    which case the caller searches instead. Only the time limit applies; a
+    simulation count does not measure solver nodes."""
+    global node_rate
+
+    if budget is None or budget.time_limit is None:
+        move, _ = solve(my, opp, obs)
+        return move
+
+    stats = np.zeros(NUM_STATS, dtype=np.int64)
+    stats[NODE_LIMIT] = max(1, int(node_rate * max(0.0, budget.time_limit - budget.elapsed())))
+
+    start = time.perf_counter()
+    move, _ = solve_limited(my, opp, obs, stats)
+    elapsed = time.perf_counter() - start
+
+    # Short solves are dominated by call overhead and say little about speed.
+    if elapsed > 0.01:
+        node_rate = stats[NODES] / elapsed
+
+    return None if stats[ABORTED] else move
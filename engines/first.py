@@ -1,5 +1,4 @@
 from numba import njit
-import random
 import game.bitboard as bitop
 
 
@@ -7,7 +6,6 @@ import game.bitboard as bitop
 def run(my, opp, obs):
     my_moves = bitop.generate_moves(my, opp, obs)
 
-    for i in range(8 * 8):
-        if my_moves & (1 << i):
-            return i
+    if my_moves:
+        return bitop.bit_index(my_moves)
     return 0
\ No newline at end of file
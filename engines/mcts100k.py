@@ -1,159 +1,41 @@
 from numba import njit
-from typing import Dict
+import multiprocessing
+import threading
 import random
 
-import game.bitboard as bitop
 import game.util as util
+import engines.endgame as endgame
+import engines.mcts_node as mcts_node
+from engines.budget import Budget
 
 
-c_puct = 0.01
-simul_N = 100000
+# Number of worker processes for root-parallel search; 1 searches in-process.
+# Workers are started on the first parallel search; see get_pool.
+workers = 1
 
+# Number of threads sharing one tree in tree-parallel search.
+threads = 1
+virtual_loss = 3
+lock_stripes = 64
 
-class Node:
-    def __init__(self, parent, my, opp, obs, turn):
-        self.parent = parent
-        self.my = my
-        self.opp = opp
-        self.obs = obs
-        self.turn = turn
-        self.N = self.W = self.Q = 0
-        self.edges: Dict[int, Node] = {}
 
-        self.leaf = True
-        self.my_moves = bitop.generate_moves(my, opp, obs)
-        self.opp_moves = bitop.generate_moves(opp, my, obs)
-        self.terminal = (self.my_moves == self.opp_moves == 0)
+class Node(mcts_node.Node):
+    __slots__ = ()
 
-    def is_root(self):
-        return self.parent is None
+    c_puct = 0.01
+    simul_N = 100000
 
-    @staticmethod
-    def from_array(arr):
-        my, opp, obs = bitop.array_to_bits(arr)
-
-        return Node(None, my, opp, obs, 0)
-
-    def simulate(self):
-        node = self
-        while not (node.leaf or node.terminal):
-            node = node.select()
-
-        node.expand()
-        node.backup()
-
-    def best_move_mcts(self):
+    def best_move_infinite(self, exit, threads=1):
         if self.terminal:
             return None
 
-        for _ in range(simul_N):
-            self.simulate()
-
-        action = max(self.edges, key=lambda a: self.edges[a].N)
-
-        return action
-
-    def best_move_infinite(self, exit):
-        if self.terminal:
-            return
-
-        while not exit:
-            self.simulate()
-
-    def make_move_mcts(self):
-        action = self.best_move_mcts()
-        next_root = self.edges[action]
-        next_root.parent = None
-
-        return next_root
-
-    def select(self):
-        best_action = 0
-        best_value = float('-inf')
-
-        N_total = sum(child.N for child in self.edges.values())
-
-        for action, child in self.edges.items():
-            U = c_puct * N_total / (1 + child.N)
-            value = child.Q + U
-
-            if value > best_value:
-                best_action = action
-                best_value = value
-
-        return self.edges[best_action]
-
-    def evaluate(self):
-        my, opp, obs = self.my, self.opp, self.obs
-        return Node._fast_evaluate(my, opp, obs)
-
-    @staticmethod
-    @njit('i4(u8, u8, u8)')
-    def _fast_evaluate(my, opp, obs):
-        turn = 0
-
-        while not bitop.is_terminated(my, opp, obs):
-            my_moves = bitop.generate_moves(my, opp, obs)
-
-            if my_moves:
-                while True:
-                    i = random.randrange(64)
-                    if my_moves & (1 << i):
-                        break
-                my, opp = bitop.resolve_move(my, opp, i)
-
-            my, opp = opp, my
-
-            turn ^= 1
-
-        if turn:
-            my, opp = opp, my
-
-        score = bitop.evaluate(my, opp, obs)
-        if score > 0:
-            V = 1
-        elif score == 0:
-            V = 0.5
+        if threads > 1:
+            search_threaded(self, threads, exit=exit)
         else:
-            V = 0
-
-        return V
-
-    def expand(self):
-        self.leaf = False
-        V = self.evaluate()
-
-        if self.my_moves:
-            for action in range(8 * 8):
-                if self.my_moves & (1 << action):
-                    my, opp = bitop.resolve_move(self.my, self.opp, action)
-                    self.edges[action] = Node(self, opp, my, self.obs, self.turn ^ 1)
-        elif self.opp_moves:
-            self.edges[64] = Node(self, self.opp, self.my, self.obs, self.turn ^ 1)
-
-        self.V = V
-
-    def backup(self):
-        node = self
-        while True:
-            node.N += 1
-            node.W += 1 - self.V if (node.turn == self.turn) else self.V
-            node.Q = node.W / node.N
-            if node.is_root():
-                break
-            node = node.parent
-
-    def play(self):
-        pass
+            while not exit:
+                self.simulate()
 
-    def __repr__(self):
-        my = self.my
-        opp = self.opp
-
-        if self.turn == 1:
-            my, opp = opp, my
-
-        return bitop.to_string(my, opp, self.obs)
+        return self.best_action()
 
 
 def test(N):
@@ -166,9 +48,265 @@ def test(N):
             root = root.make_move_mcts()
 
 
-def run(my, opp, obs):
+# Tree-parallel search.
+#
+# Threads share one tree. A thread adds a virtual loss to every node it
+# descends into, so that concurrent threads spread over different lines, and
+# takes it back in backup. Node statistics are guarded by striped locks, and
+# rollouts run without holding the GIL. The stripes are made again from
+# lock_stripes when a search starts with a different setting.
+
+_locks = [threading.Lock() for _ in range(lock_stripes)]
+
+
+def _lock(node):
+    return _locks[(id(node) >> 4) % len(_locks)]
+
+
+def simulate_threaded(root):
+    node = root
+    # Children this thread created. Another thread can take over a new leaf
+    # before this one reaches it, so there may be more than one.
+    created = []
+    while True:
+        with _lock(node):
+            if node.leaf or node.terminal:
+                node.leaf = False
+                break
+            action = node.select()
+            new = action not in node.edges
+            child = node.child(action)
+            if new:
+                created.append(child)
+
+        with _lock(child):
+            child.N += virtual_loss
+            child.Q = child.W / child.N
+        node = child
+
+    V = node.evaluate()
+    if node.terminal:
+        node.proven = 1 - V
+
+    leaf = child = node
+    below = 0
+    while node is not None:
+        with _lock(node):
+            if node is not leaf:
+                below += child in created
+                node.size += below
+                if child.proven is not None and node.proven is None:
+                    node.solve()
+            node.N += mcts_node.rollout_K if node is root else mcts_node.rollout_K - virtual_loss
+            node.W += mcts_node.rollout_K * (1 - V if (node.turn == leaf.turn) else V)
+            node.Q = node.W / node.N
+        child, node = node, None if node is root else node.parent
+
+
+def search_threaded(root, n_threads, budget=None, exit=None):
+    """Run simulate_threaded on root from n_threads threads until the
+    budget runs out, the best move is decided, or exit becomes true.
+    Returns the number of simulations run.
+
+    When the tree outgrows max_nodes the threads are joined and the tree is
+    pruned before they resume. An exception in any thread stops the others
+    and is raised again once they have been joined."""
+    global _locks
+    if budget is None and exit is None:
+        budget = Budget(simulations=Node.simul_N)
+    if len(_locks) != lock_stripes:
+        _locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    stop = threading.Event()
+    full = threading.Event()
+    done_lock = threading.Lock()
+    done = 0
+    errors = []
+
+    def worker():
+        nonlocal done
+        try:
+            while not (stop.is_set() or full.is_set()):
+                simulate_threaded(root)
+
+                with done_lock:
+                    done += 1
+                    if budget is not None:
+                        budget.done += 1
+                        if budget.exhausted():
+                            stop.set()
+                        else:
+                            # Root children are added under the root's lock.
+                            with _lock(root):
+                                if root.decided(budget.remaining()):
+                                    stop.set()
+                if exit:
+                    stop.set()
+                if mcts_node.max_nodes and root.size > mcts_node.max_nodes:
+                    full.set()
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    while not stop.is_set():
+        workers = [threading.Thread(target=worker) for _ in range(n_threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        if errors:
+            raise errors[0]
+
+        if full.is_set():
+            root.prune(int(mcts_node.max_nodes * mcts_node.prune_ratio))
+            full.clear()
+
+    return done
+
+
+@njit('void(i8)')
+def _seed(seed):
+    random.seed(seed)
+
+
+# mcts_node settings that spawned workers would otherwise take from a fresh
+# import; they are sent with each job, together with Node.c_puct.
+_worker_settings = ('rollout_K', 'rollout_parallel', 'max_nodes', 'prune_ratio', 'rave', 'rave_k')
+
+
+def _settings():
+    return {name: getattr(mcts_node, name) for name in _worker_settings}
+
+
+def _root_search(args):
+    my, opp, obs, seed, simulations, time_limit, c_puct, settings = args
+
+    Node.c_puct = c_puct
+    for name, value in settings.items():
+        setattr(mcts_node, name, value)
+
+    random.seed(seed)
+    _seed(seed)
+
     root = Node(None, my, opp, obs, 0)
-    action = root.best_move_mcts()
+    budget = Budget(simulations, time_limit)
+    root.search(budget)
+
+    return budget.done, {action: (child.N, child.W, child.proven) for action, child in root.edges.items()}
+
+
+def merge_root_stats(results):
+    """Total simulations and merged {action: (N, W, proven)} root
+    statistics of _root_search results. N and W are summed; a move proven by
+    any worker keeps its proven value."""
+    done, merged = 0, {}
+    for worker_done, edges in results:
+        done += worker_done
+        for action, (N, W, proven) in edges.items():
+            merged_N, merged_W, merged_proven = merged.get(action, (0, 0, None))
+            if merged_proven is None:
+                merged_proven = proven
+            merged[action] = (merged_N + N, merged_W + W, merged_proven)
+    return done, merged
+
+
+# Workers are spawned rather than forked: forking after numba has set up its
+# threading layer for the parallel kernels in game.bitboard can deadlock the
+# children. The pool is kept between moves so workers compile only once.
+_pool = None
+_pool_processes = 0
+
+
+def _warm_up(ready):
+    """Pool initializer: run a short search so that everything is compiled
+    before the worker takes a job, then report ready."""
+    Node.from_array(util.initial_setup()).search(Budget(simulations=20))
+    ready.put(None)
+
+
+def get_pool(processes):
+    """The pool of root-parallel workers, started on first use. Returns
+    once every worker has imported and compiled the engine, which can take
+    tens of seconds; call get_pool(workers) when setting the engine up so
+    that the first move does not pay for it."""
+    global _pool, _pool_processes
+    if _pool is None or _pool_processes != processes:
+        close_pool()
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        _pool = context.Pool(processes, _warm_up, (ready,))
+        _pool_processes = processes
+        for _ in range(processes):
+            ready.get()
+    return _pool
+
+
+def close_pool():
+    global _pool, _pool_processes
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+        _pool_processes = 0
+
+
+def best_move_parallel(my, opp, obs, processes, budget=None, seed=None):
+    """Root-parallel search: each worker process searches the position
+    independently with its own seed and a share of the simulations, and the
+    root statistics are summed. The move is picked as by Node.best_action: a
+    move proven won by any worker, otherwise the most visited move not proven
+    lost. Returns the move and the merged {action: (N, Q)} statistics.
+
+    Starting the pool, if it is not running yet, counts against the
+    budget's time limit."""
+    if budget is None:
+        budget = Budget(simulations=Node.simul_N)
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    pool = get_pool(processes)
+
+    simulations = None
+    if budget.simulations is not None:
+        simulations = max(1, -(-(budget.simulations - budget.done) // processes))
+    time_limit = None
+    if budget.time_limit is not None:
+        time_limit = max(0.0, budget.time_limit - budget.elapsed())
+
+    jobs = [(my, opp, obs, seed + i, simulations, time_limit, Node.c_puct, _settings()) for i in range(processes)]
+
+    done, merged = merge_root_stats(pool.map(_root_search, jobs))
+    budget.done += done
+
+    stats = {action: (N, W / N if N else 0) for action, (N, W, _) in merged.items()}
+    if not merged:
+        # A forced move is decided before any root child is visited.
+        actions = Node(None, my, opp, obs, 0).actions()
+        return (actions[0] if actions else None), stats
+
+    def key(action):
+        N, _, proven = merged[action]
+        return proven == 1, proven != 0, N
+
+    return max(merged, key=key), stats
+
+
+def run(my, opp, obs, budget=None):
+    if endgame.count_empty(my, opp, obs) <= endgame.empty_threshold:
+        move = endgame.run(my, opp, obs, budget)
+        if move is not None:
+            return move
+
+    if workers > 1:
+        action, _ = best_move_parallel(my, opp, obs, workers, budget)
+        return action
+
+    root = Node(None, my, opp, obs, 0)
+    if threads > 1 and not root.terminal:
+        search_threaded(root, threads, budget)
+        return root.best_action()
+
+    action = root.best_move_mcts(budget)
     #print(root, root.edges[action].Q)
     return action
 
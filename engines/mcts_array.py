@@ -0,0 +1,298 @@
+import time
+
+from numba import njit, i4, u8, f8
+from numba.experimental import jitclass
+import numpy as np
+
+import game.bitboard as bitop
+import game.codec as codec
+import game.util as util
+import engines.endgame as endgame
+from engines.budget import Budget
+
+
+c_puct = 0.01
+simul_N = 100000
+tree_capacity = 1 << 20
+
+# Simulations per compiled call between budget checks.
+chunk_N = 1000
+
+PASS = 64
+NO_NODE = -1
+
+
+@njit('f8(u8, u8, u8)')
+def rollout(my, opp, obs):
+    """Result of a uniformly random playout for the player to move: 1 for a
+    win, 0.5 for a draw and 0 for a loss."""
+    turn = 0
+
+    while True:
+        my_moves = bitop.generate_moves_kogge_stone(my, opp, obs)
+
+        if my_moves:
+            my, opp = bitop.resolve_move_kogge_stone(my, opp, bitop.random_bit(my_moves))
+        elif not bitop.generate_moves_kogge_stone(opp, my, obs):
+            break
+
+        my, opp = opp, my
+        turn ^= 1
+
+    if turn:
+        my, opp = opp, my
+
+    score = bitop.evaluate(my, opp, obs)
+    if score > 0:
+        return 1.0
+    elif score == 0:
+        return 0.5
+    else:
+        return 0.0
+
+
+# The tree lives in preallocated arrays indexed by node id, with the children
+# of a node stored contiguously from first_child. As in engines.mcts100k, W
+# and Q are from the point of view of the player who moved into the node.
+
+@jitclass([
+    ('parent', i4[:]),
+    ('first_child', i4[:]),
+    ('n_children', i4[:]),
+    ('move', i4[:]),
+    ('N', i4[:]),
+    ('W', f8[:]),
+    ('my', u8[:]),
+    ('opp', u8[:]),
+    ('obs', u8),
+    ('size', i4),
+    ('c_puct', f8),
+])
+class Tree:
+    def __init__(self, capacity, c_puct):
+        self.parent = np.empty(capacity, dtype=np.int32)
+        self.first_child = np.empty(capacity, dtype=np.int32)
+        self.n_children = np.empty(capacity, dtype=np.int32)
+        self.move = np.empty(capacity, dtype=np.int32)
+        self.N = np.empty(capacity, dtype=np.int32)
+        self.W = np.empty(capacity, dtype=np.float64)
+        self.my = np.empty(capacity, dtype=np.uint64)
+        self.opp = np.empty(capacity, dtype=np.uint64)
+        self.obs = np.uint64(0)
+        self.size = 0
+        self.c_puct = c_puct
+
+    @property
+    def capacity(self):
+        return len(self.parent)
+
+    def reset(self, my, opp, obs):
+        self.obs = obs
+        self.size = 1
+        self.init_node(0, NO_NODE, PASS, my, opp)
+
+    def init_node(self, node, parent, move, my, opp):
+        self.parent[node] = parent
+        self.first_child[node] = NO_NODE
+        self.n_children[node] = 0
+        self.move[node] = move
+        self.N[node] = 0
+        self.W[node] = 0.0
+        self.my[node] = my
+        self.opp[node] = opp
+
+    def select(self, node):
+        first = self.first_child[node]
+        last = first + self.n_children[node]
+
+        N_total = 0
+        for child in range(first, last):
+            N_total += self.N[child]
+
+        best_child = first
+        best_value = -np.inf
+        for child in range(first, last):
+            Q = self.W[child] / self.N[child] if self.N[child] else 0.0
+            value = Q + self.c_puct * N_total / (1 + self.N[child])
+
+            if value > best_value:
+                best_child = child
+                best_value = value
+
+        return best_child
+
+    def expand(self, node):
+        my, opp = self.my[node], self.opp[node]
+        my_moves = bitop.generate_moves_kogge_stone(my, opp, self.obs)
+
+        if my_moves:
+            n = bitop.popcount(my_moves)
+        elif bitop.generate_moves_kogge_stone(opp, my, self.obs):
+            n = 1
+        else:
+            return
+
+        if self.size + n > self.capacity:
+            return
+
+        first = self.size
+        if my_moves:
+            for child in range(first, first + n):
+                action, my_moves = bitop.pop_lowest(my_moves)
+                new_my, new_opp = bitop.resolve_move_kogge_stone(my, opp, action)
+                self.init_node(child, node, action, new_opp, new_my)
+        else:
+            self.init_node(first, node, PASS, opp, my)
+
+        self.first_child[node] = first
+        self.n_children[node] = n
+        self.size += n
+
+    def backup(self, node, V):
+        value = 1 - V
+        while node != NO_NODE:
+            self.N[node] += 1
+            self.W[node] += value
+            value = 1 - value
+            node = self.parent[node]
+
+    def simulate(self):
+        node = 0
+        while self.n_children[node]:
+            node = self.select(node)
+
+        V = rollout(self.my[node], self.opp[node], self.obs)
+        self.expand(node)
+        self.backup(node, V)
+
+    def search(self, simulations):
+        for _ in range(simulations):
+            self.simulate()
+
+    def decided(self, remaining):
+        """Whether the most visited root move can no longer be overtaken
+        within `remaining` more simulations."""
+        first = self.first_child[0]
+        if first == NO_NODE:
+            return self.N[0] > 0
+        if self.n_children[0] < 2:
+            return True
+
+        best = second = 0
+        for child in range(first, first + self.n_children[0]):
+            if self.N[child] > best:
+                best, second = self.N[child], best
+            elif self.N[child] > second:
+                second = self.N[child]
+
+        return best - second > remaining
+
+    def best_move(self):
+        first = self.first_child[0]
+        if first == NO_NODE:
+            return PASS
+
+        best_child = first
+        for child in range(first, first + self.n_children[0]):
+            if self.N[child] > self.N[best_child]:
+                best_child = child
+
+        return self.move[best_child]
+
+
+# The module's tree, made on first use so that importing allocates nothing.
+tree = None
+
+
+def get_tree():
+    """The module's tree, made again when tree_capacity has changed, with
+    the current c_puct."""
+    global tree
+    if tree is None or len(tree.N) != tree_capacity:
+        tree = Tree(tree_capacity, c_puct)
+    tree.c_puct = c_puct
+    return tree
+
+
+def search(tree, budget):
+    """Search tree in compiled chunks, at least one simulation, until the
+    budget runs out or the best root move is decided. Returns the number of
+    simulations run.
+
+    The first chunk is a single simulation, which expands the root, so a
+    forced move is decided at once."""
+    n = 1
+    while True:
+        if budget.simulations is not None:
+            n = max(1, min(n, budget.simulations - budget.done))
+
+        tree.search(n)
+        budget.done += n
+
+        if budget.exhausted() or tree.decided(int(min(budget.remaining(), 2 ** 31 - 1))):
+            break
+        n = chunk_N
+
+    return budget.done
+
+
+def _warm_up():
+    """Compile the Tree methods called from Python, on a small tree, rather
+    than inside the first timed search."""
+    small = Tree(64, c_puct)
+    small.reset(codec.INITIAL_MY, codec.INITIAL_OPP, np.uint64(0))
+    small.search(1)
+    small.decided(0)
+    small.best_move()
+
+
+_warm_up()
+
+
+def run(my, opp, obs, budget=None):
+    if endgame.count_empty(my, opp, obs) <= endgame.empty_threshold:
+        move = endgame.run(my, opp, obs, budget)
+        if move is not None:
+            return move
+
+    if budget is None:
+        budget = Budget(simulations=simul_N)
+
+    tree = get_tree()
+    tree.reset(np.uint64(my), np.uint64(opp), np.uint64(obs))
+    search(tree, budget)
+    return tree.best_move()
+
+
+def benchmark(simulations=20000, seed=0):
+    """Simulations per second of the array tree and of the Node tree in
+    engines.mcts100k, searching one opening position after a warm-up."""
+    import random
+    import engines.mcts100k as mcts100k
+
+    random.seed(seed)
+    my, opp, obs = bitop.array_to_bits(util.initial_setup())
+
+    tree = get_tree()
+
+    def array_search(N):
+        tree.reset(np.uint64(my), np.uint64(opp), np.uint64(obs))
+        tree.search(N)
+        return N
+
+    def node_search(N):
+        return mcts100k.Node(None, my, opp, obs, 0).search(Budget(simulations=N))
+
+    results = {}
+    for name, search_N in (('array', array_search), ('node', node_search)):
+        search_N(100)
+        start = time.perf_counter()
+        done = search_N(simulations)
+        results[name] = done / (time.perf_counter() - start)
+        print(f'{name}: {results[name]:.0f} simulations/s')
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
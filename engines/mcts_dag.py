@@ -0,0 +1,161 @@
+from typing import Dict
+
+import game.bitboard as bitop
+import game.hashing as hashing
+import engines.endgame as endgame
+from engines.budget import Budget
+from engines.mcts_node import rollout
+
+
+c_puct = 0.01
+simul_N = 100000
+
+PASS = 64
+
+
+class Node:
+    """A position in the search graph. Every path reaching the position
+    shares its N, W and Q, which are from the point of view of the player
+    who moved into it, as in engines.mcts100k."""
+    __slots__ = ('key', 'my', 'opp', 'obs', 'turn', 'N', 'W', 'Q',
+                 'edges', 'visits', 'leaf', 'my_moves', 'terminal')
+
+    def __init__(self, key, my, opp, obs, turn):
+        self.key = key
+        self.my = my
+        self.opp = opp
+        self.obs = obs
+        self.turn = turn
+        self.N = self.W = self.Q = 0
+
+        # Children by action, created on first selection, and how many
+        # simulations went through each edge.
+        self.edges: Dict[int, Node] = {}
+        self.visits: Dict[int, int] = {}
+
+        self.leaf = True
+        self.my_moves = bitop.generate_moves(my, opp, obs)
+        self.terminal = not self.my_moves and not bitop.generate_moves(opp, my, obs)
+
+    def actions(self):
+        if self.my_moves:
+            return bitop.bit_indices(self.my_moves).tolist()
+        return [] if self.terminal else [PASS]
+
+
+class Graph:
+    """MCTS over a DAG: children are looked up by Zobrist key (side to move
+    included) in a table, so move orders that transpose share one node.
+
+    Selection takes Q from the shared child and the exploration term from
+    the edge visit count. Backup follows the path the simulation took, so a
+    shared node is updated once per simulation through it. Othello cannot
+    repeat a position, so the graph has no cycles."""
+
+    def __init__(self, my, opp, obs, turn=0):
+        self.table: Dict[int, Node] = {}
+        key = int(hashing.hash_position(my, opp, obs, turn))
+        self.root = self.lookup(key, my, opp, obs, turn)
+
+    def lookup(self, key, my, opp, obs, turn):
+        node = self.table.get(key)
+        if node is None:
+            node = self.table[key] = Node(key, my, opp, obs, turn)
+        return node
+
+    def child(self, node, action):
+        child = node.edges.get(action)
+        if child is None:
+            if action == PASS:
+                my, opp = node.my, node.opp
+            else:
+                my, opp = bitop.resolve_move(node.my, node.opp, action)
+            key = int(hashing.hash_move(node.key, node.turn, action, node.opp ^ opp))
+
+            child = self.lookup(key, opp, my, node.obs, node.turn ^ 1)
+            node.edges[action] = child
+            node.visits[action] = 0
+        return child
+
+    @staticmethod
+    def select(node):
+        best_action = PASS
+        best_value = float('-inf')
+
+        N_total = sum(node.visits.values())
+
+        for action in node.actions():
+            child = node.edges.get(action)
+            if child is None:
+                value = c_puct * N_total
+            else:
+                U = c_puct * N_total / (1 + node.visits[action])
+                value = child.Q + U
+
+            if value > best_value:
+                best_action = action
+                best_value = value
+
+        return best_action
+
+    def simulate(self):
+        node = self.root
+        path = []
+        while not (node.leaf or node.terminal):
+            action = self.select(node)
+            path.append((node, action))
+            node = self.child(node, action)
+
+        node.leaf = False
+        V = rollout(node.my, node.opp, node.obs)
+
+        leaf = node
+        for node in [leaf] + [parent for parent, _ in path]:
+            node.N += 1
+            node.W += 1 - V if (node.turn == leaf.turn) else V
+            node.Q = node.W / node.N
+
+        for parent, action in path:
+            parent.visits[action] += 1
+
+    def search(self, budget):
+        """Simulate at least once, then until the budget runs out or the
+        most followed root move can no longer be overtaken. Returns the
+        number of simulations run."""
+        while True:
+            self.simulate()
+            budget.done += 1
+
+            if budget.exhausted() or self.decided(budget.remaining()):
+                break
+
+        return budget.done
+
+    def decided(self, remaining):
+        root = self.root
+        if bitop.popcount(root.my_moves) < 2:
+            return True
+
+        visits = sorted(root.visits.values(), reverse=True) + [0, 0]
+        return visits[0] - visits[1] > remaining
+
+    def best_action(self):
+        visits = self.root.visits
+        return max(self.root.actions(), key=lambda a: visits.get(a, 0))
+
+
+def run(my, opp, obs, budget=None):
+    if endgame.count_empty(my, opp, obs) <= endgame.empty_threshold:
+        move = endgame.run(my, opp, obs, budget)
+        if move is not None:
+            return move
+
+    graph = Graph(my, opp, obs)
+    if graph.root.terminal:
+        return None
+
+    if budget is None:
+        budget = Budget(simulations=simul_N)
+    graph.search(budget)
+
+    return graph.best_action()
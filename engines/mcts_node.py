@@ -0,0 +1,390 @@
+from numba import njit, prange
+import numpy as np
+from typing import Dict
+import math
+
+import game.bitboard as bitop
+from engines.budget import Budget
+
+
+# Node-based UCT search with random playouts, shared by engines.mcts and
+# engines.mcts100k. Each engine subclasses Node with its own c_puct and
+# simul_N; the settings below apply to both.
+
+PASS = 64
+
+# Each simulation runs rollout_K random playouts from the leaf in one compiled
+# call and backs up their mean with weight rollout_K. With rollout_parallel,
+# the playouts are spread over threads.
+rollout_K = 1
+rollout_parallel = False
+
+# Hard cap on the number of nodes in a tree, at about 350 bytes a node; None
+# for no cap. Past the cap the least visited subtrees are collapsed until
+# prune_ratio of the cap is left.
+max_nodes = 1 << 20
+prune_ratio = 0.75
+
+# RAVE: expanded nodes also keep all-moves-as-first statistics, crediting a
+# playout's result to every square the player to move there played later in
+# the simulation. Selection blends them into Q with weight
+# sqrt(rave_k / (3 N + rave_k)), which fades as the move itself is visited.
+# The statistics take about 1 KB per expanded node.
+rave = False
+rave_k = 300
+
+
+@njit('Tuple((f8, u8, u8))(u8, u8, u8)', nogil=True)
+def playout(my, opp, obs):
+    """Result of a uniformly random playout for the player to move (1 for a
+    win, 0.5 for a draw and 0 for a loss), with the squares played in it by
+    the player to move and by the opponent."""
+    turn = 0
+    mine = theirs = np.uint64(0)
+
+    while not bitop.is_terminated(my, opp, obs):
+        my_moves = bitop.generate_moves(my, opp, obs)
+
+        if my_moves:
+            i = bitop.random_bit(my_moves)
+            my, opp = bitop.resolve_move(my, opp, i)
+            if turn:
+                theirs |= np.uint64(1) << np.uint64(i)
+            else:
+                mine |= np.uint64(1) << np.uint64(i)
+
+        my, opp = opp, my
+
+        turn ^= 1
+
+    if turn:
+        my, opp = opp, my
+
+    score = bitop.evaluate(my, opp, obs)
+    if score > 0:
+        value = 1.0
+    elif score == 0:
+        value = 0.5
+    else:
+        value = 0.0
+
+    return value, mine, theirs
+
+
+@njit('f8(u8, u8, u8)', nogil=True)
+def rollout(my, opp, obs):
+    value, _, _ = playout(my, opp, obs)
+    return value
+
+
+@njit('f8(u8, u8, u8, i4)', nogil=True)
+def rollout_batch(my, opp, obs, K):
+    """Mean result of K random playouts."""
+    values = np.empty(K)
+    for k in range(K):
+        values[k] = rollout(my, opp, obs)
+    return values.mean()
+
+
+@njit('f8(u8, u8, u8, i4)', parallel=True, nogil=True)
+def rollout_batch_parallel(my, opp, obs, K):
+    values = np.empty(K)
+    for k in prange(K):
+        values[k] = rollout(my, opp, obs)
+    return values.mean()
+
+
+@njit('Tuple((f8[:], u8[:], u8[:]))(u8, u8, u8, i4)', nogil=True)
+def rollout_amaf(my, opp, obs, K):
+    """Results of K random playouts with the squares played in each, as
+    returned by playout."""
+    values = np.empty(K)
+    mine = np.empty(K, dtype=np.uint64)
+    theirs = np.empty(K, dtype=np.uint64)
+    for k in range(K):
+        values[k], mine[k], theirs[k] = playout(my, opp, obs)
+    return values, mine, theirs
+
+
+@njit('void(f8[:], f8[:], u8[:], f8[:])', nogil=True)
+def amaf_update(amaf_N, amaf_W, played, values):
+    """Credit each playout's value to every square in its played mask."""
+    for k in range(len(values)):
+        bits = played[k]
+        while bits:
+            i, bits = bitop.pop_lowest(bits)
+            amaf_N[i] += 1
+            amaf_W[i] += values[k]
+
+
+class Node:
+    __slots__ = ('parent', 'my', 'opp', 'obs', 'turn', 'N', 'W', 'Q', 'V',
+                 'edges', 'leaf', 'my_moves', 'terminal', 'size', 'proven',
+                 'amaf_N', 'amaf_W', 'playouts')
+
+    # Exploration constant and default number of simulations per move.
+    c_puct = 0.05
+    simul_N = 100
+
+    def __init__(self, parent, my, opp, obs, turn):
+        self.parent = parent
+        self.my = my
+        self.opp = opp
+        self.obs = obs
+        self.turn = turn
+        self.N = self.W = self.Q = 0
+        self.edges: Dict[int, Node] = {}
+
+        # Number of nodes in the subtree rooted here, this one included.
+        self.size = 1
+
+        # Game-theoretic value once solved, like Q from the point of view of
+        # the player who moved into this node: 1 win, 0.5 draw, 0 loss.
+        self.proven = None
+
+        # RAVE statistics by square, and the playouts of the last expansion
+        # until backup has credited them.
+        self.amaf_N = self.amaf_W = None
+        self.playouts = None
+
+        self.leaf = True
+        self.my_moves = bitop.generate_moves(my, opp, obs)
+        self.terminal = not self.my_moves and not bitop.generate_moves(opp, my, obs)
+
+    def is_root(self):
+        return self.parent is None
+
+    @classmethod
+    def from_array(cls, arr):
+        my, opp, obs = bitop.array_to_bits(arr)
+
+        return cls(None, my, opp, obs, 0)
+
+    def simulate(self):
+        node = self
+        created = 0
+        while not (node.leaf or node.terminal):
+            action = node.select()
+            created = action not in node.edges
+            node = node.child(action)
+
+        node.expand()
+        node.backup(created)
+
+        if max_nodes and self.size > max_nodes:
+            self.prune(int(max_nodes * prune_ratio))
+
+    def search(self, budget):
+        """Simulate at least once, then until the budget runs out or the
+        most visited move can no longer be overtaken. Returns the number of
+        simulations run."""
+        while True:
+            self.simulate()
+            budget.done += 1
+
+            if budget.exhausted() or self.decided(budget.remaining()):
+                break
+
+        return budget.done
+
+    def decided(self, remaining):
+        if self.proven is not None or bitop.popcount(self.my_moves) < 2:
+            return True
+
+        visits = sorted((child.N for child in self.edges.values()), reverse=True) + [0, 0]
+        return visits[0] - visits[1] > remaining * rollout_K
+
+    def best_action(self):
+        """A proven win if there is one, otherwise the most visited move
+        not proven lost."""
+        edges = self.edges
+
+        def key(action):
+            child = edges.get(action)
+            if child is None:
+                return False, True, 0
+            return child.proven == 1, child.proven != 0, child.N
+
+        return max(self.actions(), key=key)
+
+    def best_move_mcts(self, budget=None):
+        if self.terminal:
+            return None
+
+        if budget is None:
+            budget = Budget(simulations=self.simul_N)
+        self.search(budget)
+
+        return self.best_action()
+
+    def make_move_mcts(self):
+        action = self.best_move_mcts()
+        next_root = self.child(action)
+        next_root.parent = None
+
+        return next_root
+
+    def actions(self):
+        if self.my_moves:
+            return bitop.bit_indices(self.my_moves).tolist()
+        return [] if self.terminal else [PASS]
+
+    def child(self, action):
+        """The child reached by action, created on first use."""
+        child = self.edges.get(action)
+        if child is None:
+            if action == PASS:
+                my, opp = self.my, self.opp
+            else:
+                my, opp = bitop.resolve_move(self.my, self.opp, action)
+            child = type(self)(self, opp, my, self.obs, self.turn ^ 1)
+            self.edges[action] = child
+        return child
+
+    def select(self):
+        """Action with the highest UCT value. Children are only created
+        once selected; until then an action counts as N = 0, Q = 0. Solved
+        children are passed over while any move is unsolved."""
+        best_action = PASS
+        best_value = float('-inf')
+
+        edges = self.edges
+        N_total = sum(child.N for child in edges.values())
+        amaf_N, amaf_W = self.amaf_N, self.amaf_W
+
+        for action in self.actions():
+            child = edges.get(action)
+            if child is not None and child.proven is not None:
+                value = -1
+            else:
+                N, Q = (child.N, child.Q) if child is not None else (0, 0)
+                if amaf_N is not None and action != PASS and amaf_N[action]:
+                    beta = math.sqrt(rave_k / (3 * N + rave_k))
+                    Q = (1 - beta) * Q + beta * amaf_W[action] / amaf_N[action]
+
+                U = self.c_puct * N_total / (1 + N)
+                value = Q + U
+
+            if value > best_value:
+                best_action = action
+                best_value = value
+
+        return best_action
+
+    def evaluate(self):
+        """Mean result of rollout_K random playouts for the player to move;
+        the exact result at a terminal node."""
+        my, opp, obs = self.my, self.opp, self.obs
+        if self.terminal or rollout_K == 1:
+            return rollout(my, opp, obs)
+        if rollout_parallel:
+            return rollout_batch_parallel(my, opp, obs, rollout_K)
+        return rollout_batch(my, opp, obs, rollout_K)
+
+    def expand(self):
+        self.leaf = False
+
+        if rave and not self.terminal:
+            if self.amaf_N is None:
+                self.amaf_N = np.zeros(8 * 8)
+                self.amaf_W = np.zeros(8 * 8)
+            self.playouts = rollout_amaf(self.my, self.opp, self.obs, rollout_K)
+            V = self.playouts[0].mean()
+        else:
+            V = self.evaluate()
+        self.V = V
+
+        if self.terminal:
+            self.proven = 1 - V
+
+    def backup(self, created=0):
+        if self.playouts is not None:
+            self.backup_amaf()
+
+        node = self
+        while True:
+            node.N += rollout_K
+            node.W += rollout_K * (1 - self.V if (node.turn == self.turn) else self.V)
+            node.Q = node.W / node.N
+            if node.is_root():
+                break
+            child, node = node, node.parent
+            node.size += created
+            if child.proven is not None and node.proven is None:
+                node.solve()
+
+    def backup_amaf(self):
+        """Credit the last playouts to the AMAF statistics of every node on
+        the path, adding the move played from each node in the tree."""
+        values, mine, theirs = self.playouts
+        self.playouts = None
+
+        node = self
+        while True:
+            if node.amaf_N is not None:
+                amaf_update(node.amaf_N, node.amaf_W, mine, values)
+            if node.is_root():
+                break
+
+            parent = node.parent
+            square = np.uint64((node.my | node.opp) ^ (parent.my | parent.opp))
+            mine, theirs = theirs | square, mine
+            values = 1 - values
+            node = parent
+
+    def solve(self):
+        """Mark this node proven if some move is a proven win for the player
+        to move, or once every move is proven."""
+        best = 0
+        for action in self.actions():
+            child = self.edges.get(action)
+            if child is None or child.proven is None:
+                best = None
+            elif child.proven == 1:
+                self.proven = 0
+                return
+            elif best is not None:
+                best = max(best, child.proven)
+
+        if best is not None:
+            self.proven = 1 - best
+
+    def prune(self, target):
+        """Collapse the least visited subtrees back into leaves until at most
+        target nodes are left below this one. A collapsed node keeps its
+        statistics and is expanded again when search next reaches it."""
+        threshold = 2
+        while self.size > target and threshold <= self.N:
+            stack = list(self.edges.values())
+            while stack:
+                node = stack.pop()
+                if node.N >= threshold:
+                    stack.extend(node.edges.values())
+                elif node.edges:
+                    node.collapse()
+            threshold *= 2
+
+    def collapse(self):
+        freed = self.size - 1
+        for child in self.edges.values():
+            child.parent = None
+        self.edges = {}
+        self.leaf = True
+
+        node = self
+        while node is not None:
+            node.size -= freed
+            node = node.parent
+
+    def play(self):
+        pass
+
+    def __repr__(self):
+        my = self.my
+        opp = self.opp
+
+        if self.turn == 1:
+            my, opp = opp, my
+
+        return bitop.to_string(my, opp, self.obs)
+
@@ -1,5 +1,4 @@
 from numba import njit
-import random
 import game.bitboard as bitop
 
 
@@ -7,7 +6,4 @@ import game.bitboard as bitop
 def run(my, opp, obs):
     my_moves = bitop.generate_moves(my, opp, obs)
 
-    while True:
-        i = random.randrange(64)
-        if my_moves & (1 << i):
-            return i
+    return bitop.random_bit(my_moves)
@@ -0,0 +1,119 @@
+import threading
+
+import game.bitboard as bitop
+import engines.endgame as endgame
+import engines.mcts100k as mcts100k
+
+
+PASS = 64
+
+
+class Session:
+    """A game-long search session for a Node-based MCTS engine module
+    (engines.mcts or engines.mcts100k).
+
+    The tree is kept between calls: after each move, by either player, the
+    root moves to the matching child so its statistics are reused. With
+    ponder=True, the session keeps searching the current root in a
+    background thread until the next call."""
+
+    def __init__(self, engine=mcts100k, ponder=True):
+        self.engine = engine
+        self.ponder = ponder
+        self.root = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def new_game(self, my, opp, obs):
+        self._stop_pondering()
+        self.root = self.engine.Node(None, my, opp, obs, 0)
+
+    def think(self, budget=None):
+        """Search the current position and return the move for the player to
+        move. The move is not played; call notify_move with it."""
+        self._stop_pondering()
+        root = self.root
+
+        if endgame.count_empty(root.my, root.opp, root.obs) <= endgame.empty_threshold:
+            move = endgame.run(root.my, root.opp, root.obs, budget)
+            if move is not None:
+                return move
+
+        return root.best_move_mcts(budget)
+
+    def notify_move(self, move):
+        """Play move (PASS for a pass) for the player to move at the root."""
+        self._stop_pondering()
+        root = self.root
+
+        child = root.edges.get(move)
+        if child is None:
+            if move == PASS:
+                my, opp = root.my, root.opp
+            else:
+                my, opp = bitop.resolve_move(root.my, root.opp, move)
+            child = self.engine.Node(None, opp, my, root.obs, root.turn ^ 1)
+
+        child.parent = None
+        self.root = child
+
+        if self.ponder:
+            self._start_pondering()
+
+    def run(self, my, opp, obs, budget=None):
+        """Stateless run(my, opp, obs) on top of the session. The position is
+        looked up within two plies of the current root, so the tree is still
+        reused when the caller does not report moves."""
+        # The ponder thread adds and prunes children, so it is stopped before
+        # the tree is walked.
+        self._stop_pondering()
+        node = self._find(my, opp, obs)
+        if node is None:
+            self.new_game(my, opp, obs)
+        else:
+            node.parent = None
+            self.root = node
+
+        move = self.think(budget)
+        if move is not None:
+            self.notify_move(move)
+        return move
+
+    def _find(self, my, opp, obs):
+        if self.root is None or self.root.obs != obs:
+            return None
+
+        frontier = [self.root]
+        for _ in range(3):
+            for node in frontier:
+                if node.my == my and node.opp == opp:
+                    return node
+            frontier = [child for node in frontier for child in node.edges.values()]
+        return None
+
+    def _start_pondering(self):
+        root = self.root
+        if root.terminal:
+            return
+
+        def ponder():
+            while not self._stop.is_set():
+                root.simulate()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=ponder, daemon=True)
+        self._thread.start()
+
+    def _stop_pondering(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+session = Session(ponder=False)
+
+
+def run(my, opp, obs, budget=None):
+    return session.run(my, opp, obs, budget)
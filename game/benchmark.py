@@ -0,0 +1,85 @@
+import time
+import numpy as np
+from numba import njit
+import game.bitboard as bitop
+import game.util as util
+
+
+@njit('Tuple((u8[:], u8[:]))(u8, u8, u8, i4)')
+def sample_positions(my, opp, obs, N):
+    my_arr = np.empty(N, dtype=np.uint64)
+    opp_arr = np.empty(N, dtype=np.uint64)
+
+    start_my, start_opp = my, opp
+    for n in range(N):
+        if bitop.is_terminated(my, opp, obs):
+            my, opp = start_my, start_opp
+
+        my_arr[n] = my
+        opp_arr[n] = opp
+
+        my_moves = bitop.generate_moves(my, opp, obs)
+        if my_moves:
+            my, opp = bitop.resolve_move(my, opp, bitop.random_bit(my_moves))
+
+        my, opp = opp, my
+
+    return my_arr, opp_arr
+
+
+def make_kernels(generate_moves, resolve_move):
+    @njit
+    def bench_generate(my_arr, opp_arr, obs, rounds):
+        acc = np.uint64(0)
+        for _ in range(rounds):
+            for n in range(len(my_arr)):
+                acc ^= generate_moves(my_arr[n], opp_arr[n], obs)
+        return acc
+
+    @njit
+    def bench_resolve(my_arr, opp_arr, obs, rounds):
+        acc = np.uint64(0)
+        count = 0
+        for _ in range(rounds):
+            for n in range(len(my_arr)):
+                moves = generate_moves(my_arr[n], opp_arr[n], obs)
+                for i in range(8 * 8):
+                    if moves & (np.uint64(1) << np.uint64(i)):
+                        my, opp = resolve_move(my_arr[n], opp_arr[n], i)
+                        acc ^= my ^ opp
+                        count += 1
+        return acc, count
+
+    return bench_generate, bench_resolve
+
+
+def run(N=10000, rounds=20):
+    arr = util.initial_setup()
+    my, opp, obs = bitop.array_to_bits(arr)
+    my_arr, opp_arr = sample_positions(my, opp, obs, N)
+
+    results = {}
+    for name, (generate_moves, resolve_move) in bitop.BACKENDS.items():
+        bench_generate, bench_resolve = make_kernels(generate_moves, resolve_move)
+
+        # Warm up to exclude compilation time.
+        bench_generate(my_arr[:1], opp_arr[:1], obs, 1)
+        bench_resolve(my_arr[:1], opp_arr[:1], obs, 1)
+
+        start = time.perf_counter()
+        bench_generate(my_arr, opp_arr, obs, rounds)
+        gen_rate = N * rounds / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        _, count = bench_resolve(my_arr, opp_arr, obs, rounds)
+        res_rate = count / (time.perf_counter() - start)
+
+        results[name] = (gen_rate, res_rate)
+        print(f'{name:>12}: generate_moves {gen_rate / 1e6:8.2f}M pos/s, '
+              f'generate+resolve_move {res_rate / 1e6:8.2f}M moves/s')
+
+    return results
+
+
+if __name__ == '__main__':
+    run()
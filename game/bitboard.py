@@ -1,5 +1,6 @@
+import random
 import numpy as np
-from numba import njit
+from numba import njit, prange
 import game.consts as consts
 
 
@@ -50,29 +51,27 @@ def popcount(x):
 
 
 def to_string(my, opp, obs):
-    pos = 1
-
-    res = ''
-    for idx in range(8 * 8):
-        if my & pos:
-            res += consts.BOARD_STR_MY
-        elif opp & pos:
-            res += consts.BOARD_STR_OPP
-        elif obs & pos:
-            res += consts.BOARD_STR_OBS
-        else:
-            res += consts.BOARD_STR_EMPTY
-
-        if idx % 8 == 7:
-            res += '\n'
-
-        pos <<= 1
-
-    return res
+    rows = []
+    for row in range(8):
+        cells = []
+        for col in range(8):
+            pos = 1 << (row * 8 + col)
+            if my & pos:
+                cells.append(consts.BOARD_STR_MY)
+            elif opp & pos:
+                cells.append(consts.BOARD_STR_OPP)
+            elif obs & pos:
+                cells.append(consts.BOARD_STR_OBS)
+            else:
+                cells.append(consts.BOARD_STR_EMPTY)
+        cells.append('\n')
+        rows.append(''.join(cells))
+
+    return ''.join(rows)
 
 
 def from_string(s):
-    s = sum(s.split(), '')
+    s = ''.join(s.split())
 
     assert len(s) == 8 * 8
 
@@ -89,6 +88,52 @@ def from_string(s):
             assert c == consts.BOARD_STR_EMPTY
         pos <<= 1
 
+    return np.uint64(my), np.uint64(opp), np.uint64(obs)
+
+
+# Set-bit iteration.
+#
+# These cost O(popcount) rather than O(64), so loops over legal moves scale
+# with the number of moves instead of the board size.
+
+@njit('u8(u8)')
+def lowest_bit(x):
+    return x & (~x + np.uint64(1))
+
+
+@njit('i4(u8)')
+def bit_index(x):
+    """Index of the lowest set bit of x, or 64 if x is empty."""
+    return popcount(lowest_bit(x) - np.uint64(1))
+
+
+@njit('Tuple((i4, u8))(u8)')
+def pop_lowest(x):
+    return bit_index(x), x & (x - np.uint64(1))
+
+
+@njit('i4[:](u8)')
+def bit_indices(x):
+    """Indices of the set bits of x in increasing order."""
+    res = np.empty(popcount(x), dtype=np.int32)
+    for n in range(len(res)):
+        res[n], x = pop_lowest(x)
+    return res
+
+
+@njit('i4(u8, i4)')
+def kth_bit(x, k):
+    """Index of the k-th lowest set bit of x (0-based)."""
+    for _ in range(k):
+        x &= x - np.uint64(1)
+    return bit_index(x)
+
+
+@njit('i4(u8)')
+def random_bit(x):
+    """Index of a set bit of x chosen uniformly at random."""
+    return kth_bit(x, random.randrange(popcount(x)))
+
 
 # Bitboard operations.
 
@@ -216,3 +261,304 @@ def resolve_move(my_disks, opp_disks, board_idx):
     assert my_disks & opp_disks == 0, "The sets must still be disjoint."
 
     return my_disks, opp_disks
+
+
+# Kogge-Stone move generation.
+#
+# Same semantics as generate_moves/resolve_move above, but every direction is
+# filled with three parallel-prefix steps instead of six dependent shifts, and
+# the shift amounts and wrap masks are literals rather than table lookups.
+
+NOT_H_FILE = np.uint64(0x7F7F7F7F7F7F7F7F)
+NOT_A_FILE = np.uint64(0xFEFEFEFEFEFEFEFE)
+ALL_FILES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+@njit('u8(u8, u8, u8)', inline='always')
+def _fill_right(gen, pro, s):
+    gen |= pro & (gen >> s)
+    pro &= pro >> s
+    gen |= pro & (gen >> (s * 2))
+    pro &= pro >> (s * 2)
+    gen |= pro & (gen >> (s * 4))
+    return gen
+
+
+@njit('u8(u8, u8, u8)', inline='always')
+def _fill_left(gen, pro, s):
+    gen |= pro & (gen << s)
+    pro &= pro << s
+    gen |= pro & (gen << (s * 2))
+    pro &= pro << (s * 2)
+    gen |= pro & (gen << (s * 4))
+    return gen
+
+
+@njit('u8(u8, u8, u8, u8, u8)', inline='always')
+def _moves_right(my_disks, opp_disks, empty_cells, s, mask):
+    pro = opp_disks & mask
+    x = _fill_right(pro & (my_disks >> s), pro, s)
+    return (x >> s) & mask & empty_cells
+
+
+@njit('u8(u8, u8, u8, u8, u8)', inline='always')
+def _moves_left(my_disks, opp_disks, empty_cells, s, mask):
+    pro = opp_disks & mask
+    x = _fill_left(pro & (my_disks << s), pro, s)
+    return (x << s) & mask & empty_cells
+
+
+@njit('u8(u8, u8, u8, u8, u8)', inline='always')
+def _flips_right(new_disk, my_disks, opp_disks, s, mask):
+    pro = opp_disks & mask
+    x = _fill_right(pro & (new_disk >> s), pro, s)
+    return x if (x >> s) & mask & my_disks else np.uint64(0)
+
+
+@njit('u8(u8, u8, u8, u8, u8)', inline='always')
+def _flips_left(new_disk, my_disks, opp_disks, s, mask):
+    pro = opp_disks & mask
+    x = _fill_left(pro & (new_disk << s), pro, s)
+    return x if (x << s) & mask & my_disks else np.uint64(0)
+
+
+@njit('u8(u8, u8, u8)')
+def generate_moves_kogge_stone(my_disks, opp_disks, obstacles):
+    empty_cells = ~(my_disks | opp_disks | obstacles)
+
+    return (_moves_right(my_disks, opp_disks, empty_cells, 1, NOT_H_FILE)
+            | _moves_right(my_disks, opp_disks, empty_cells, 9, NOT_H_FILE)
+            | _moves_right(my_disks, opp_disks, empty_cells, 8, ALL_FILES)
+            | _moves_right(my_disks, opp_disks, empty_cells, 7, NOT_A_FILE)
+            | _moves_left(my_disks, opp_disks, empty_cells, 1, NOT_A_FILE)
+            | _moves_left(my_disks, opp_disks, empty_cells, 9, NOT_A_FILE)
+            | _moves_left(my_disks, opp_disks, empty_cells, 8, ALL_FILES)
+            | _moves_left(my_disks, opp_disks, empty_cells, 7, NOT_H_FILE))
+
+
+@njit('Tuple((u8, u8))(u8, u8, i4)')
+def resolve_move_kogge_stone(my_disks, opp_disks, board_idx):
+    new_disk = np.uint64(1) << np.uint64(board_idx)
+
+    captured_disks = (_flips_right(new_disk, my_disks, opp_disks, 1, NOT_H_FILE)
+                      | _flips_right(new_disk, my_disks, opp_disks, 9, NOT_H_FILE)
+                      | _flips_right(new_disk, my_disks, opp_disks, 8, ALL_FILES)
+                      | _flips_right(new_disk, my_disks, opp_disks, 7, NOT_A_FILE)
+                      | _flips_left(new_disk, my_disks, opp_disks, 1, NOT_A_FILE)
+                      | _flips_left(new_disk, my_disks, opp_disks, 9, NOT_A_FILE)
+                      | _flips_left(new_disk, my_disks, opp_disks, 8, ALL_FILES)
+                      | _flips_left(new_disk, my_disks, opp_disks, 7, NOT_H_FILE))
+
+    return my_disks ^ captured_disks ^ new_disk, opp_disks ^ captured_disks
+
+
+BACKENDS = {
+    'shift': (generate_moves, resolve_move),
+    'kogge_stone': (generate_moves_kogge_stone, resolve_move_kogge_stone),
+}
+
+
+# Evaluation helpers.
+#
+# Board features for the engines' evaluation functions and search cutoffs.
+
+@njit('u8(u8)')
+def neighbours(x):
+    """Cells adjacent to any cell of x in one of the eight directions."""
+    return (((x >> 1) & NOT_H_FILE) | ((x >> 9) & NOT_H_FILE) | (x >> 8) | ((x >> 7) & NOT_A_FILE)
+            | ((x << 1) & NOT_A_FILE) | ((x << 9) & NOT_A_FILE) | (x << 8) | ((x << 7) & NOT_H_FILE))
+
+
+@njit('u8(u8, u8, u8, u8, u8)', inline='always')
+def _axis_stable(filled, empty_cells, open_cells, stable, s):
+    """Cells that cannot be flipped along the axis through shift s, given
+    disks already known to be stable."""
+    mask_right = NOT_A_FILE if s == 7 else (ALL_FILES if s == 8 else NOT_H_FILE)
+    mask_left = NOT_H_FILE if s == 7 else (ALL_FILES if s == 8 else NOT_A_FILE)
+
+    # Cells whose line (up to edges and obstacles) has no empty cell.
+    reaches_empty = (_fill_right(empty_cells, filled & mask_right, s)
+                     | _fill_left(empty_cells, filled & mask_left, s))
+    full = filled & ~reaches_empty
+
+    # Cells with an edge, obstacle or stable disk of the same color on
+    # either side.
+    closed = (~((open_cells >> s) & mask_right) | ~((open_cells << s) & mask_left)
+              | ((stable >> s) & mask_right) | ((stable << s) & mask_left))
+
+    return full | closed
+
+
+@njit('u8(u8, u8, u8)')
+def stable_disks(my_disks, opp_disks, obstacles):
+    """Disks of my_disks that can never be flipped. Obstacles act like the
+    board edge: a disk cannot be flipped along a line ending in one."""
+    filled = my_disks | opp_disks
+    empty_cells = ~(filled | obstacles)
+    open_cells = ~obstacles
+
+    stable = np.uint64(0)
+    while True:
+        new_stable = (my_disks
+                      & _axis_stable(filled, empty_cells, open_cells, stable, 1)
+                      & _axis_stable(filled, empty_cells, open_cells, stable, 7)
+                      & _axis_stable(filled, empty_cells, open_cells, stable, 8)
+                      & _axis_stable(filled, empty_cells, open_cells, stable, 9))
+        if new_stable == stable:
+            return stable
+        stable = new_stable
+
+
+# Batched operations.
+#
+# Array versions of the functions above. Each takes uint64 arrays holding N
+# positions (obstacles are per position too) and runs over the batch in
+# parallel, so callers pay a single Python to numba transition per batch.
+
+@njit('u8[:](u8[:])', parallel=True)
+def popcount_batch(x):
+    res = np.empty(len(x), dtype=np.uint64)
+    for n in prange(len(x)):
+        res[n] = popcount(x[n])
+    return res
+
+
+@njit('u8[:](u8[:], u8[:], u8[:])', parallel=True)
+def generate_moves_batch(my_disks, opp_disks, obstacles):
+    res = np.empty(len(my_disks), dtype=np.uint64)
+    for n in prange(len(my_disks)):
+        res[n] = generate_moves_kogge_stone(my_disks[n], opp_disks[n], obstacles[n])
+    return res
+
+
+@njit('Tuple((u8[:], u8[:]))(u8[:], u8[:], i4[:])', parallel=True)
+def resolve_move_batch(my_disks, opp_disks, board_idx):
+    my_res = np.empty(len(my_disks), dtype=np.uint64)
+    opp_res = np.empty(len(my_disks), dtype=np.uint64)
+    for n in prange(len(my_disks)):
+        my_res[n], opp_res[n] = resolve_move_kogge_stone(my_disks[n], opp_disks[n], board_idx[n])
+    return my_res, opp_res
+
+
+@njit('i4[:](u8[:], u8[:], u8[:])', parallel=True)
+def is_terminated_batch(my_disks, opp_disks, obstacles):
+    res = np.empty(len(my_disks), dtype=np.int32)
+    for n in prange(len(my_disks)):
+        my, opp, obs = my_disks[n], opp_disks[n], obstacles[n]
+        i_can_move = generate_moves_kogge_stone(my, opp, obs) > 0
+        opp_can_move = generate_moves_kogge_stone(opp, my, obs) > 0
+        res[n] = not (i_can_move or opp_can_move)
+    return res
+
+
+@njit('i4[:](u8[:], u8[:], u8[:])', parallel=True)
+def evaluate_batch(my_disks, opp_disks, obstacles):
+    res = np.empty(len(my_disks), dtype=np.int32)
+    for n in prange(len(my_disks)):
+        res[n] = evaluate(my_disks[n], opp_disks[n], obstacles[n])
+    return res
+
+
+# Symmetry.
+#
+# Transform t in range(8) applies, in order, a horizontal flip if t & 1, a
+# vertical flip if t & 2 and a transposition if t & 4. These generate all
+# eight rotations and reflections of the board.
+
+NUM_TRANSFORMS = 8
+
+INVERSE_TRANSFORMS = np.array([0, 1, 2, 3, 4, 6, 5, 7], dtype=np.int32)
+
+
+_K1 = np.uint64(0x5555555555555555)
+_K2 = np.uint64(0x3333333333333333)
+_K4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_K8 = np.uint64(0x00FF00FF00FF00FF)
+_K16 = np.uint64(0x0000FFFF0000FFFF)
+_D7 = np.uint64(0x5500550055005500)
+_D14 = np.uint64(0x3333000033330000)
+_D28 = np.uint64(0x0F0F0F0F00000000)
+
+
+@njit('u8(u8)')
+def flip_vertical(x):
+    x = ((x >> 8) & _K8) | ((x & _K8) << 8)
+    x = ((x >> 16) & _K16) | ((x & _K16) << 16)
+    return (x >> 32) | (x << 32)
+
+
+@njit('u8(u8)')
+def flip_horizontal(x):
+    x = ((x >> 1) & _K1) | ((x & _K1) << 1)
+    x = ((x >> 2) & _K2) | ((x & _K2) << 2)
+    return ((x >> 4) & _K4) | ((x & _K4) << 4)
+
+
+@njit('u8(u8)')
+def flip_diagonal(x):
+    t = _D28 & (x ^ (x << 28))
+    x ^= t ^ (t >> 28)
+    t = _D14 & (x ^ (x << 14))
+    x ^= t ^ (t >> 14)
+    t = _D7 & (x ^ (x << 7))
+    x ^= t ^ (t >> 7)
+    return x
+
+
+@njit('u8(u8, i4)')
+def transform(x, t):
+    if t & 1:
+        x = flip_horizontal(x)
+    if t & 2:
+        x = flip_vertical(x)
+    if t & 4:
+        x = flip_diagonal(x)
+    return x
+
+
+@njit('i4(i4, i4)')
+def transform_square(board_idx, t):
+    row, col = divmod(board_idx, 8)
+    if t & 1:
+        col = 7 - col
+    if t & 2:
+        row = 7 - row
+    if t & 4:
+        row, col = col, row
+    return row * 8 + col
+
+
+@njit('Tuple((u8, u8, u8, i4))(u8, u8, u8)')
+def canonical(my, opp, obs):
+    """Minimal (my, opp, obs) among the symmetric variants, and the transform
+    that maps the given position onto it."""
+    best_my, best_opp, best_obs, best_t = my, opp, obs, 0
+
+    for t in range(1, NUM_TRANSFORMS):
+        t_my = transform(my, t)
+        if t_my > best_my:
+            continue
+
+        t_opp = transform(opp, t)
+        if t_my == best_my and t_opp > best_opp:
+            continue
+
+        t_obs = transform(obs, t)
+        if t_my == best_my and t_opp == best_opp and t_obs >= best_obs:
+            continue
+
+        best_my, best_opp, best_obs, best_t = t_my, t_opp, t_obs, t
+
+    return best_my, best_opp, best_obs, best_t
+
+
+@njit('Tuple((u8[:], u8[:], u8[:], i4[:]))(u8[:], u8[:], u8[:])', parallel=True)
+def canonical_batch(my_disks, opp_disks, obstacles):
+    N = len(my_disks)
+    my_res = np.empty(N, dtype=np.uint64)
+    opp_res = np.empty(N, dtype=np.uint64)
+    obs_res = np.empty(N, dtype=np.uint64)
+    t_res = np.empty(N, dtype=np.int32)
+    for n in prange(N):
+        my_res[n], opp_res[n], obs_res[n], t_res[n] = canonical(my_disks[n], opp_disks[n], obstacles[n])
+    return my_res, opp_res, obs_res, t_res
@@ -0,0 +1,137 @@
+import numpy as np
+from numba import njit
+import game.bitboard as bitop
+
+
+# Positions are packed as three little-endian uint64 (my, opp, obs), 24 bytes
+# each, so a file of positions is just the raw bytes of a record array.
+
+POSITION_DTYPE = np.dtype([('my', '<u8'), ('opp', '<u8'), ('obs', '<u8')])
+POSITION_SIZE = POSITION_DTYPE.itemsize
+
+# Game records start from the standard four disks and only store the obstacle
+# mask followed by the moves played. Passes are forced, so they are implied
+# rather than stored:
+#
+#   obs: <u8 | n_moves: u1 | moves: n_moves * u1
+
+RECORD_HEADER_DTYPE = np.dtype([('obs', '<u8'), ('n_moves', 'u1')])
+RECORD_HEADER_SIZE = RECORD_HEADER_DTYPE.itemsize
+
+INITIAL_MY = np.uint64((1 << (3 * 8 + 3)) | (1 << (4 * 8 + 4)))
+INITIAL_OPP = np.uint64((1 << (3 * 8 + 4)) | (1 << (4 * 8 + 3)))
+
+PASS = 64
+
+
+def positions_from_bits(my, opp, obs):
+    positions = np.empty(len(my), dtype=POSITION_DTYPE)
+    positions['my'] = my
+    positions['opp'] = opp
+    positions['obs'] = obs
+    return positions
+
+
+def encode_position(my, opp, obs):
+    return positions_from_bits([my], [opp], [obs]).tobytes()
+
+
+def decode_position(buf):
+    pos = np.frombuffer(buf, dtype=POSITION_DTYPE, count=1)[0]
+    return pos['my'], pos['opp'], pos['obs']
+
+
+def encode_positions(positions):
+    return np.ascontiguousarray(positions, dtype=POSITION_DTYPE).tobytes()
+
+
+def decode_positions(buf):
+    """Decode a buffer of packed positions into a (read-only) record array
+    without copying."""
+    return np.frombuffer(buf, dtype=POSITION_DTYPE)
+
+
+def save_positions(path, positions):
+    with open(path, 'wb') as f:
+        f.write(encode_positions(positions))
+
+
+def load_positions(path):
+    return np.fromfile(path, dtype=POSITION_DTYPE)
+
+
+def encode_game(obs, moves):
+    moves = np.asarray([m for m in moves if m != PASS], dtype=np.uint8)
+
+    header = np.empty(1, dtype=RECORD_HEADER_DTYPE)
+    header['obs'] = obs
+    header['n_moves'] = len(moves)
+
+    return header.tobytes() + moves.tobytes()
+
+
+def encode_games(games):
+    return b''.join(encode_game(obs, moves) for obs, moves in games)
+
+
+@njit
+def _record_offsets(buf):
+    count = 0
+    offset = 0
+    while offset < len(buf):
+        if offset + RECORD_HEADER_SIZE > len(buf):
+            raise ValueError('truncated game record header')
+        offset += RECORD_HEADER_SIZE + buf[offset + RECORD_HEADER_SIZE - 1]
+        if offset > len(buf):
+            raise ValueError('truncated game record moves')
+        count += 1
+
+    offsets = np.empty(count + 1, dtype=np.int64)
+    offsets[0] = 0
+    for n in range(count):
+        offsets[n + 1] = offsets[n] + RECORD_HEADER_SIZE + buf[offsets[n] + RECORD_HEADER_SIZE - 1]
+    return offsets
+
+
+def decode_games(buf):
+    """Decode concatenated game records into a list of (obs, moves). Raises
+    ValueError if the last record is cut short."""
+    buf = np.frombuffer(buf, dtype=np.uint8)
+    offsets = _record_offsets(buf)
+
+    games = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        obs = buf[start:start + 8].view('<u8')[0]
+        games.append((obs, buf[start + RECORD_HEADER_SIZE:end]))
+    return games
+
+
+@njit
+def _replay(obs, moves):
+    N = len(moves)
+    my_arr = np.empty(N + 1, dtype=np.uint64)
+    opp_arr = np.empty(N + 1, dtype=np.uint64)
+    turn_arr = np.empty(N + 1, dtype=np.int32)
+
+    my, opp, turn = INITIAL_MY, INITIAL_OPP, 0
+    for n in range(N + 1):
+        if (not bitop.generate_moves_kogge_stone(my, opp, obs)
+                and bitop.generate_moves_kogge_stone(opp, my, obs)):
+            my, opp, turn = opp, my, turn ^ 1
+
+        my_arr[n] = my
+        opp_arr[n] = opp
+        turn_arr[n] = turn
+
+        if n < N:
+            my, opp = bitop.resolve_move_kogge_stone(my, opp, moves[n])
+            my, opp, turn = opp, my, turn ^ 1
+
+    return my_arr, opp_arr, turn_arr
+
+
+def replay_game(obs, moves):
+    """Positions before each move and the final position, from the point of
+    view of the player to move, and which player (0 moved first) that is."""
+    my, opp, turn = _replay(np.uint64(obs), np.asarray(moves, dtype=np.uint8))
+    return positions_from_bits(my, opp, np.full(len(my), obs, dtype=np.uint64)), turn
@@ -0,0 +1,142 @@
+import numpy as np
+from numba import njit, u8
+from numba.experimental import jitclass
+import game.bitboard as bitop
+
+
+# Zobrist keys.
+#
+# Keys are defined over absolute colors: disks of the player who moved first
+# (turn 0) use row 0 and the other player's use row 1, so the key survives the
+# my/opp swap after every move and can be updated incrementally.
+
+SEED = 20200315
+
+_rng = np.random.default_rng(SEED)
+ZOBRIST = _rng.integers(0, 2 ** 64, size=(3, 8 * 8), dtype=np.uint64)
+ZOBRIST_FLIP = ZOBRIST[0] ^ ZOBRIST[1]
+ZOBRIST_SIDE = np.uint64(_rng.integers(0, 2 ** 64, dtype=np.uint64))
+
+PASS = 64
+
+
+@njit('u8(u8, i4)')
+def hash_bits(bits, row):
+    key = np.uint64(0)
+    while bits:
+        i, bits = bitop.pop_lowest(bits)
+        key ^= ZOBRIST[row, i]
+    return key
+
+
+@njit('u8(u8, u8, u8, i4)')
+def hash_position(my, opp, obs, turn):
+    """Key of the position with `my` to move, where `turn` is 0 or 1."""
+    if turn:
+        my, opp = opp, my
+
+    key = hash_bits(my, 0) ^ hash_bits(opp, 1) ^ hash_bits(obs, 2)
+    if turn:
+        key ^= ZOBRIST_SIDE
+    return key
+
+
+@njit('u8(u8, i4, i4, u8)')
+def hash_move(key, turn, board_idx, captured):
+    """Key after the player `turn` plays board_idx, flipping `captured`."""
+    key ^= ZOBRIST_SIDE
+    if board_idx == PASS:
+        return key
+
+    key ^= ZOBRIST[turn, board_idx]
+    while captured:
+        i, captured = bitop.pop_lowest(captured)
+        key ^= ZOBRIST_FLIP[i]
+    return key
+
+
+# Transposition table.
+#
+# Each bucket holds two entries: the first is replaced only by deeper (or
+# stale) results, the second always. Entries are stored as (key ^ data, data)
+# so that a torn write from a concurrent writer fails the key check on probe
+# instead of returning mixed-up data.
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+_VALID = np.uint64(1 << 63)
+
+
+@njit('u8(i4, i4, i4, i4, u8)')
+def pack_entry(value, depth, flag, move, generation):
+    data = np.uint64(np.uint16(np.int16(value)))
+    data |= np.uint64(depth & 0xFF) << np.uint64(16)
+    data |= np.uint64(flag & 0x3) << np.uint64(24)
+    data |= np.uint64(move & 0x7F) << np.uint64(32)
+    data |= (generation & np.uint64(0xFF)) << np.uint64(40)
+    return data | _VALID
+
+
+@njit('Tuple((i4, i4, i4, i4, u8))(u8)')
+def unpack_entry(data):
+    value = np.int32(np.int16(np.uint16(data & np.uint64(0xFFFF))))
+    depth = np.int32((data >> np.uint64(16)) & np.uint64(0xFF))
+    flag = np.int32((data >> np.uint64(24)) & np.uint64(0x3))
+    move = np.int32((data >> np.uint64(32)) & np.uint64(0x7F))
+    generation = (data >> np.uint64(40)) & np.uint64(0xFF)
+    return value, depth, flag, move, generation
+
+
+@jitclass([
+    ('keys', u8[:]),
+    ('data', u8[:]),
+    ('mask', u8),
+    ('generation', u8),
+])
+class TranspositionTable:
+    def __init__(self, size_log2):
+        self.keys = np.zeros(2 << size_log2, dtype=np.uint64)
+        self.data = np.zeros(2 << size_log2, dtype=np.uint64)
+        self.mask = np.uint64((1 << size_log2) - 1)
+        self.generation = np.uint64(0)
+
+    def clear(self):
+        self.keys[:] = 0
+        self.data[:] = 0
+        self.generation = np.uint64(0)
+
+    def new_search(self):
+        self.generation = (self.generation + np.uint64(1)) & np.uint64(0xFF)
+
+    def _bucket(self, key):
+        return np.int64(key & self.mask) * 2
+
+    def store(self, key, value, depth, flag, move):
+        idx = self._bucket(key)
+        data = pack_entry(value, depth, flag, move, self.generation)
+
+        old = self.data[idx]
+        same_key = (self.keys[idx] ^ old) == key
+        _, old_depth, _, _, old_generation = unpack_entry(old)
+
+        if (not old & _VALID or same_key or depth >= old_depth
+                or old_generation != self.generation):
+            self.keys[idx] = key ^ data
+            self.data[idx] = data
+        else:
+            self.keys[idx + 1] = key ^ data
+            self.data[idx + 1] = data
+
+    def probe(self, key):
+        """Return (found, value, depth, flag, move) for key."""
+        idx = self._bucket(key)
+
+        for i in range(idx, idx + 2):
+            data = self.data[i]
+            if data & _VALID and (self.keys[i] ^ data) == key:
+                value, depth, flag, move, _ = unpack_entry(data)
+                return True, value, depth, flag, move
+
+        return False, 0, 0, 0, 0
@@ -66,19 +66,21 @@ class Othello:
         return Othello(opp, my, obs)
 
     def to_string(self):
-        arr = self.array
+        my, opp, obs = self.bits
 
         res = ''
+        pos = np.uint64(1)
         for x in range(8):
             for y in range(8):
-                if arr[0][x][y]:
+                if my & pos:
                     res += '.'
-                elif arr[1][x][y]:
+                elif opp & pos:
                     res += 'x'
-                elif arr[2][x][y]:
+                elif obs & pos:
                     res += '#'
                 else:
                     res += ' '
+                pos <<= np.uint64(1)
             res += '\n'
 
         return res
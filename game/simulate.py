@@ -2,7 +2,6 @@ import numpy as np
 from numba import njit
 from game.othello import Othello, array_to_bits
 import game.bitboard as bitop
-import random
 
 
 @njit
@@ -14,12 +13,9 @@ def simulate(o: Othello):
         if moves == 0:
             o = o.make_move_pass()
         else:
-            while True:
-                index = random.randrange(64)
-                if (1 << index) & moves:
-                    row, col = divmod(index, 8)
-                    o = o.make_move(row, col)
-                    break
+            index = bitop.random_bit(moves)
+            row, col = divmod(index, 8)
+            o = o.make_move(row, col)
         turn ^= 1
 
     if turn:
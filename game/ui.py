@@ -1,4 +1,5 @@
 import time
+import os
 import threading
 import game.bitboard as bitop
 import game.util as util
@@ -226,7 +227,7 @@ def analysis_mcts():
                 self.exit = exit
 
             def run(self):
-                root.best_move_infinite(self.exit)
+                root.best_move_infinite(self.exit, threads=os.cpu_count() or 1)
 
         AI(exitEvent).start()
 
@@ -239,15 +240,20 @@ def analysis_mcts():
             def run(self):
                 time.sleep(0.1)
                 while not self.exit:
-                    edges = root.edges
-                    best_i = max((i for i in edges), key=lambda i: edges[i].Q)
-                    for i, node in edges.items():
-                        x, y = divmod(i, 8)
-                        text = f'{node.N // 1000}k\n{round(node.Q * 100, 1)}%'
-                        bg = colors['bestmove'] if i == best_i else colors['move']
-                        buttons[x][y].config(text=text, bg=bg)
+                    # Search threads add root children as they go.
+                    with ai._lock(root):
+                        edges = dict(root.edges)
+                    if edges:
+                        best_i = max((i for i in edges), key=lambda i: edges[i].Q)
+                        for i, node in edges.items():
+                            x, y = divmod(i, 8)
+                            text = f'{node.N // 1000}k\n{round(node.Q * 100, 1)}%'
+                            bg = colors['bestmove'] if i == best_i else colors['move']
+                            buttons[x][y].config(text=text, bg=bg)
                     time.sleep(0.1)
-                for i in root.edges:
+                with ai._lock(root):
+                    edges = dict(root.edges)
+                for i in edges:
                     x, y = divmod(i, 8)
                     buttons[x][y].config(text='')
                 drawing_thread_done.set(True)
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+
+import numpy as np
+
+import game.bitboard as bitop
+import game.hashing as hashing
+
+
+PASS = 64
+
+# SQUARE_TRANSFORMS[t][i] is where transform t sends policy index i; the pass
+# index stays put.
+SQUARE_TRANSFORMS = np.array([
+    [bitop.transform_square(i, t) for i in range(8 * 8)] + [PASS]
+    for t in range(bitop.NUM_TRANSFORMS)
+], dtype=np.int64)
+
+
+class EvalCache:
+    """LRU cache of network outputs by position, in front of a model with
+    ResidualCNN's eval and eval_batch.
+
+    Entries are keyed by the Zobrist key of the position. With symmetric=True
+    the position is canonicalized first, so all symmetric variants share one
+    entry, and the cached policy is permuted back to the position asked
+    for."""
+
+    def __init__(self, model, size=1 << 16, symmetric=False):
+        self.model = model
+        self.size = size
+        self.symmetric = symmetric
+
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def load(self, id):
+        self.model.load(id)
+        self.clear()
+
+    def eval(self, my, opp, obs):
+        return self.eval_batch([(my, opp, obs)])
+
+    def eval_batch(self, positions):
+        """Policy logits and values for a list of (my, opp, obs). Positions
+        not in the cache go to the model in one batch."""
+        policies = np.empty((len(positions), 8 * 8 + 1), dtype=np.float32)
+        values = np.empty((len(positions), 1), dtype=np.float32)
+
+        keys, transforms, missing = [], [], {}
+        for my, opp, obs in positions:
+            t = 0
+            if self.symmetric:
+                my, opp, obs, t = bitop.canonical(my, opp, obs)
+            key = int(hashing.hash_position(my, opp, obs, 0))
+
+            keys.append(key)
+            transforms.append(t)
+            if key not in self.entries and key not in missing:
+                missing[key] = (my, opp, obs)
+
+        fresh = {}
+        if missing:
+            new_policies, new_values = self.model.eval_batch(list(missing.values()))
+            fresh = dict(zip(missing, zip(new_policies, new_values)))
+
+        for n, (key, t) in enumerate(zip(keys, transforms)):
+            if key in fresh:
+                policy, value = fresh[key]
+            else:
+                policy, value = self.entries[key]
+                self.entries.move_to_end(key)
+
+            policies[n] = policy[SQUARE_TRANSFORMS[t]]
+            values[n] = value
+
+        for key, entry in fresh.items():
+            self.entries[key] = entry
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+        self.misses += len(fresh)
+        self.hits += len(positions) - len(fresh)
+        return policies, values
+
+    def __repr__(self):
+        return f'EvalCache(entries={len(self.entries)}, hits={self.hits}, misses={self.misses})'
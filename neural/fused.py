@@ -0,0 +1,161 @@
+import time
+
+import numpy as np
+
+import game.bitboard as bitop
+import game.util as util
+
+
+# Inference for ResidualCNN in plain NumPy, with each BatchNormalization
+# folded into the convolution before it. Nothing here imports Keras; export
+# only needs a built ResidualCNN passed in.
+
+fused_path = 'weights/fused_{}.npz'
+
+
+def fold_batch_norm(kernel, bias, gamma, beta, mean, var, epsilon):
+    """Kernel and bias of a convolution followed by inference-mode batch
+    normalization, as one convolution."""
+    scale = gamma / np.sqrt(var + epsilon)
+    return kernel * scale, (bias - mean) * scale + beta
+
+
+def conv2d(x, kernel, bias):
+    """'same' convolution of x (batch, 8, 8, channels) with a Keras-layout
+    kernel (height, width, channels, filters)."""
+    kh, kw, channels, filters = kernel.shape
+    if kh == kw == 1:
+        return x @ kernel[0, 0] + bias
+
+    ph, pw = kh // 2, kw // 2
+    padded = np.pad(x, ((0, 0), (ph, ph), (pw, pw), (0, 0)))
+    columns = np.concatenate([padded[:, i:i + 8, j:j + 8, :] for i in range(kh) for j in range(kw)], axis=-1)
+    return columns @ kernel.reshape(kh * kw * channels, filters) + bias
+
+
+def leaky_relu(x, alpha):
+    return np.where(x > 0, x, alpha * x)
+
+
+class FusedCNN:
+    """ResidualCNN's forward pass over exported parameters: convs (kernel,
+    bias) pairs with batch normalization folded in, for the stem, each
+    residual block's two convolutions and the policy and value heads, then
+    the dense layers of the heads. Has the same eval and eval_batch as
+    ResidualCNN."""
+
+    def __init__(self, params=None):
+        self.params = params
+
+    def load(self, id):
+        with np.load(fused_path.format(id)) as data:
+            self.params = dict(data)
+
+    def save(self, id):
+        np.savez(fused_path.format(id), **self.params)
+
+    def conv(self, x, n):
+        return conv2d(x, self.params[f'conv{n}_kernel'], self.params[f'conv{n}_bias'])
+
+    def dense(self, x, name):
+        return x @ self.params[f'{name}_kernel'] + self.params[f'{name}_bias']
+
+    def forward(self, x):
+        """Policy logits (batch, 65) and values (batch, 1) for inputs
+        (batch, 8, 8, 3)."""
+        alpha = self.params['alpha']
+        n_convs = len([key for key in self.params if key.startswith('conv') and key.endswith('_kernel')])
+
+        x = leaky_relu(self.conv(x, 0), alpha)
+        for n in range(1, n_convs - 2, 2):
+            y = leaky_relu(self.conv(x, n), alpha)
+            x = leaky_relu(self.conv(y, n + 1) + x, alpha)
+
+        policy = leaky_relu(self.conv(x, n_convs - 2), alpha).reshape(len(x), -1)
+        policy = self.dense(policy, 'policy')
+
+        value = leaky_relu(self.conv(x, n_convs - 1), alpha).reshape(len(x), -1)
+        value = np.maximum(self.dense(value, 'value_hidden'), 0)
+        value = np.tanh(self.dense(value, 'value'))
+
+        return policy, value
+
+    @staticmethod
+    def to_input(my, opp, obs):
+        arr = bitop.bits_to_array(my, opp, obs)
+        return np.moveaxis(arr, 0, -1).astype(np.float32)
+
+    def eval(self, my, opp, obs):
+        return self.forward(FusedCNN.to_input(my, opp, obs)[np.newaxis])
+
+    def eval_batch(self, positions):
+        return self.forward(np.stack([FusedCNN.to_input(my, opp, obs) for my, opp, obs in positions]))
+
+
+def export(model):
+    """FusedCNN with the weights of a ResidualCNN.
+
+    Layers are matched by type and shape rather than by name: trunk
+    convolutions have 36 filters and pair with the 36-channel batch norms in
+    order; the 2- and 1-filter convolutions are the policy and value heads;
+    dense layers with 65, 36 and 1 units are the policy output, the value
+    hidden layer and the value output."""
+    layers = model.model.layers
+    by_type = {}
+    for layer in layers:
+        by_type.setdefault(type(layer).__name__, []).append(layer)
+
+    def channels(layer):
+        return layer.get_weights()[0].shape[-1]
+
+    params = {}
+
+    convs = sorted(by_type['Conv2D'], key=lambda layer: -channels(layer))
+    norms = sorted(by_type['BatchNormalization'], key=lambda layer: -channels(layer))
+    for n, (conv, norm) in enumerate(zip(convs, norms)):
+        kernel, bias = conv.get_weights()
+        gamma, beta, mean, var = norm.get_weights()
+        params[f'conv{n}_kernel'], params[f'conv{n}_bias'] = fold_batch_norm(
+            kernel, bias, gamma, beta, mean, var, norm.epsilon)
+
+    names = {8 * 8 + 1: 'policy', 36: 'value_hidden', 1: 'value'}
+    for dense in by_type['Dense']:
+        kernel, bias = dense.get_weights()
+        name = names[kernel.shape[-1]]
+        params[f'{name}_kernel'], params[f'{name}_bias'] = kernel, bias
+
+    config = by_type['LeakyReLU'][0].get_config()
+    params['alpha'] = np.float32(config.get('negative_slope', config.get('alpha')))
+
+    return FusedCNN({key: np.asarray(value, dtype=np.float32) for key, value in params.items()})
+
+
+def benchmark(model, fused, N=200):
+    """Mean single-position latency in seconds of model.predict and of the
+    fused engine."""
+    my, opp, obs = bitop.array_to_bits(util.initial_setup())
+    x = FusedCNN.to_input(my, opp, obs)[np.newaxis]
+
+    results = {}
+    for name, predict in (('keras', lambda: model.model.predict(x, verbose=0)), ('fused', lambda: fused.forward(x))):
+        predict()
+        start = time.perf_counter()
+        for _ in range(N):
+            predict()
+        results[name] = (time.perf_counter() - start) / N
+        print(f'{name}: {results[name] * 1e3:.3f} ms')
+
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    from neural.model import ResidualCNN
+
+    model_id = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    model = ResidualCNN()
+    model.load(model_id)
+
+    fused = export(model)
+    fused.save(model_id)
+    benchmark(model, fused)
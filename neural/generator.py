@@ -0,0 +1,177 @@
+import argparse
+import multiprocessing
+import os
+import random
+
+import numpy as np
+
+import game.bitboard as bitop
+import game.codec as codec
+import game.util as util
+from engines.budget import Budget
+
+
+# Self-play training data for ResidualCNN.
+#
+# Games are played in shards of shard_games games, one shard per task in a
+# pool of worker processes. Each shard is written to a temporary file and
+# renamed into place when complete, so an interrupted run resumes by playing
+# only the shards that are missing. Shard n is seeded from the base seed and
+# n, so a resumed run produces the same data as an uninterrupted one.
+
+data_path = 'data/selfplay/'
+shard_games = 20
+
+c_puct = 0.05
+simul_N = 100
+batch_size = 8
+
+# Moves are sampled in proportion to visit counts for this many plies, then
+# the most visited move is played.
+sample_plies = 10
+
+# A shard stores its games as game.codec game records, which leave out passes,
+# and alongside them the root visit count of every move (index 64 is a pass)
+# before each move played. Positions and outcomes are recovered by replaying
+# the games; see load_shards.
+NUM_ACTIONS = 8 * 8 + 1
+
+
+def shard_name(index):
+    return f'shard_{index:05d}.npz'
+
+
+def play_game(rng):
+    """One self-play game with the neural MCTS configured by neural.nn.MTCS:
+    its obstacles, the moves played without passes, and the root visit
+    counts before each move."""
+    from neural.nn import Node, PASS
+
+    my, opp, obs = bitop.array_to_bits(util.initial_setup())
+    root = Node(None, my, opp, obs)
+    moves, visits = [], []
+
+    while not root.terminal:
+        root.best_move_mcts(Budget(simulations=Node.simul_N))
+
+        actions = root.actions()
+        counts = np.array([root.edges[a].N if a in root.edges else 0 for a in actions], dtype=np.float64)
+
+        if len(moves) < sample_plies and counts.sum() > 0:
+            action = actions[rng.choice(len(actions), p=counts / counts.sum())]
+        else:
+            action = actions[int(np.argmax(counts))]
+
+        # A forced pass is implied by the game record and teaches nothing.
+        if action != PASS:
+            row = np.zeros(NUM_ACTIONS, dtype=np.uint16)
+            row[actions] = np.minimum(counts, np.iinfo(np.uint16).max)
+            # A forced move ends the search before any child is visited.
+            row[action] = max(row[action], 1)
+            moves.append(action)
+            visits.append(row)
+
+        root = root.child(action)
+        root.parent = None
+
+    return obs, moves, np.array(visits, dtype=np.uint16).reshape(-1, NUM_ACTIONS)
+
+
+def game_targets(obs, moves):
+    """Positions before each move of a game, from the point of view of the
+    player to move, and the final outcome for that player: 1 win, 0 draw,
+    -1 loss."""
+    positions, turn = codec.replay_game(obs, moves)
+    final = positions[-1]
+    score = np.sign(bitop.evaluate(final['my'], final['opp'], final['obs']))
+    return positions[:-1], np.where(turn[:-1] == turn[-1], score, -score).astype(np.int8)
+
+
+def write_shard(path, games):
+    """Write (obs, moves, visits) games to path atomically."""
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f,
+                 games=np.frombuffer(codec.encode_games((obs, moves) for obs, moves, _ in games), dtype=np.uint8),
+                 visits=np.concatenate([visits for _, _, visits in games]))
+    os.replace(path + '.tmp', path)
+
+
+def play_shard(args):
+    """Play one shard and write it atomically. Runs in a worker process."""
+    index, games, out_dir, seed, engine, model_id, simulations = args
+    from neural.nn import MTCS
+
+    random.seed(seed + index)
+    rng = np.random.default_rng(seed + index)
+    MTCS(c_puct, simulations, model_id, batch_size, engine=engine)
+
+    played = [play_game(rng) for _ in range(games)]
+    write_shard(os.path.join(out_dir, shard_name(index)), played)
+    return index, sum(len(moves) for _, moves, _ in played)
+
+
+def generate(games, workers=None, out_dir=data_path, seed=0, engine='fused', model_id=0, simulations=simul_N):
+    """Play `games` self-play games into shards under out_dir, skipping
+    shards already there. Returns the number of positions written."""
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+
+    # Shards a worker was still writing when the last run stopped.
+    for name in os.listdir(out_dir):
+        if name.endswith('.npz.tmp'):
+            os.remove(os.path.join(out_dir, name))
+
+    n_shards = -(-games // shard_games)
+    jobs = []
+    for index in range(n_shards):
+        path = os.path.join(out_dir, shard_name(index))
+        if not os.path.exists(path):
+            n = min(shard_games, games - index * shard_games)
+            jobs.append((index, n, out_dir, seed, engine, model_id, simulations))
+
+    print(f'{n_shards - len(jobs)} of {n_shards} shards done, playing {len(jobs)}')
+
+    written = 0
+    if not jobs:
+        return written
+
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        for index, n_records in pool.imap_unordered(play_shard, jobs):
+            written += n_records
+            print(f'{shard_name(index)}: {n_records} positions')
+
+    return written
+
+
+def load_shards(out_dir=data_path):
+    """Positions (codec.POSITION_DTYPE), root visit counts and outcomes of
+    every game under out_dir, in shard order."""
+    names = sorted(name for name in os.listdir(out_dir) if name.startswith('shard_') and name.endswith('.npz'))
+
+    positions = [np.zeros(0, dtype=codec.POSITION_DTYPE)]
+    visits = [np.zeros((0, NUM_ACTIONS), dtype=np.uint16)]
+    outcomes = [np.zeros(0, dtype=np.int8)]
+    for name in names:
+        with np.load(os.path.join(out_dir, name)) as data:
+            games, shard_visits = codec.decode_games(data['games']), data['visits']
+        for obs, moves in games:
+            game_positions, game_outcomes = game_targets(obs, moves)
+            positions.append(game_positions)
+            outcomes.append(game_outcomes)
+        visits.append(shard_visits)
+
+    return np.concatenate(positions), np.concatenate(visits), np.concatenate(outcomes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate self-play training data.')
+    parser.add_argument('games', type=int)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=data_path)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', default='fused', choices=('keras', 'fused', 'int8', 'float16'))
+    parser.add_argument('--model', type=int, default=0)
+    parser.add_argument('--simulations', type=int, default=simul_N)
+    args = parser.parse_args()
+
+    generate(args.games, args.workers, args.out, args.seed, args.engine, args.model, args.simulations)
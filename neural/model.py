@@ -66,12 +66,22 @@ class ResidualCNN:
     def save(self, id):
         self.model.save_weights(weight_path + str(id))
 
-    def eval(self, my, opp, obs):
+    @staticmethod
+    def to_input(my, opp, obs):
         arr = bitop.bits_to_array(my, opp, obs)
-        arr = np.moveaxis(arr, 0, -1)
-        arr = np.reshape(arr, (1, 8, 8, 3))
-        return self.model.predict(arr)
+        return np.moveaxis(arr, 0, -1).astype(np.float32)
+
+    def eval(self, my, opp, obs):
+        arr = np.reshape(ResidualCNN.to_input(my, opp, obs), (1, 8, 8, 3))
+        return self.model.predict_on_batch(arr)
+
+    def eval_batch(self, positions):
+        """Policy logits and values for a list of (my, opp, obs), in one
+        forward pass."""
+        arr = np.stack([ResidualCNN.to_input(my, opp, obs) for my, opp, obs in positions])
+        return self.model.predict_on_batch(arr)
 
 
-m = ResidualCNN()
-m.save(0)
\ No newline at end of file
+if __name__ == '__main__':
+    m = ResidualCNN()
+    m.save(0)
\ No newline at end of file
@@ -3,7 +3,17 @@ from typing import Dict
 
 import game.bitboard as bitop
 import game.util as util
-from neural.model import ResidualCNN
+from engines.budget import Budget
+from neural.cache import EvalCache
+from neural.fused import FusedCNN
+from neural.quantized import QuantizedCNN
+
+
+PASS = 64
+
+# Visits added to every node on a pending path while its leaf waits for a
+# batched evaluation, to steer the other selections in the batch elsewhere.
+virtual_loss = 3
 
 
 class Node:
@@ -15,12 +25,12 @@ class Node:
         self.turn = turn
         self.N = self.W = self.Q = 0
         self.P = P
+        self.P_a = None
         self.edges: Dict[int, Node] = {}
 
         self.leaf = True
         self.my_moves = bitop.generate_moves(my, opp, obs)
-        self.opp_moves = bitop.generate_moves(opp, my, obs)
-        self.terminal = (self.my_moves == self.opp_moves == 0)
+        self.terminal = not self.my_moves and not bitop.generate_moves(opp, my, obs)
 
     def is_root(self):
         return self.parent is None
@@ -34,50 +44,147 @@ class Node:
     def simulate(self):
         node = self
         while not (node.leaf or node.terminal):
-            node = node.select()
+            node = node.child(node.select())
 
         node.expand()
         node.backup()
 
-    def best_move_mcts(self):
+    def search(self, budget):
+        while True:
+            self.simulate()
+            budget.done += 1
+
+            if budget.exhausted() or self.decided(budget.remaining()):
+                break
+
+        return budget.done
+
+    def search_batched(self, budget, batch_size):
+        """As search, but each round selects up to batch_size leaves under
+        virtual loss and evaluates them in one forward pass."""
+        while True:
+            n = batch_size
+            if budget.simulations is not None:
+                n = max(1, min(n, budget.simulations - budget.done))
+
+            leaves = self.select_leaves(n)
+            P_a_logits, Vs = Node.model.eval_batch([(leaf.my, leaf.opp, leaf.obs) for leaf in leaves])
+
+            for leaf, P_a_logit, V in zip(leaves, P_a_logits, Vs):
+                leaf.add_virtual_loss(-virtual_loss)
+                leaf.expand(leaf.interpret(P_a_logit, V))
+                leaf.backup()
+            budget.done += len(leaves)
+
+            if budget.exhausted() or self.decided(budget.remaining()):
+                break
+
+        return budget.done
+
+    def select_leaves(self, n):
+        """Up to n distinct leaves, each left with a virtual loss on its
+        path. Stops early when a selection reaches a leaf already taken."""
+        leaves = []
+        pending = set()
+        for _ in range(n):
+            node = self
+            while not (node.leaf or node.terminal):
+                node = node.child(node.select())
+
+            if id(node) in pending:
+                break
+            pending.add(id(node))
+            leaves.append(node)
+            node.add_virtual_loss(virtual_loss)
+
+        return leaves
+
+    def add_virtual_loss(self, n):
+        node = self
+        while not node.is_root():
+            node.N += n
+            node.Q = node.W / node.N if node.N else 0
+            node = node.parent
+
+    def decided(self, remaining):
+        if bitop.popcount(self.my_moves) < 2:
+            return True
+
+        visits = sorted((child.N for child in self.edges.values()), reverse=True) + [0, 0]
+        return visits[0] - visits[1] > remaining
+
+    def best_action(self):
+        edges = self.edges
+        return max(self.actions(), key=lambda a: edges[a].N if a in edges else 0)
+
+    def best_move_mcts(self, budget=None):
         if self.terminal:
             return None
 
-        for _ in range(Node.simul_N):
-            self.simulate()
-
-        action = max(self.edges, key=lambda a: self.edges[a].N)
+        if budget is None:
+            budget = Budget(simulations=Node.simul_N)
+        if Node.batch_size > 1:
+            self.search_batched(budget, Node.batch_size)
+        else:
+            self.search(budget)
 
-        return action
+        return self.best_action()
 
     def make_move_mcts(self):
         action = self.best_move_mcts()
-        next_root = self.edges[action]
+        next_root = self.child(action)
         next_root.parent = None
 
         return next_root
 
+    def actions(self):
+        if self.my_moves:
+            return bitop.bit_indices(self.my_moves).tolist()
+        return [] if self.terminal else [PASS]
+
+    def child(self, action):
+        """The child reached by action, created on first use with its prior
+        from the policy recorded at expansion."""
+        child = self.edges.get(action)
+        if child is None:
+            if action == PASS:
+                my, opp = self.my, self.opp
+            else:
+                my, opp = bitop.resolve_move(self.my, self.opp, action)
+            child = Node(self, opp, my, self.obs, -self.turn, self.P_a[action])
+            self.edges[action] = child
+        return child
+
     def select(self):
-        best_action = 0
+        """Action with the highest PUCT value. Children are only created
+        once selected; until then an action counts as N = 0, Q = 0."""
+        best_action = PASS
         best_value = float('-inf')
 
-        N_total = sum(child.N for child in self.edges.values())
+        edges = self.edges
+        N_total = sum(child.N for child in edges.values())
 
-        for action, child in self.edges.items():
-            U = Node.c_puct * child.P * N_total / (1 + child.N)
-            value = child.Q + U
+        for action in self.actions():
+            child = edges.get(action)
+            if child is None:
+                value = Node.c_puct * self.P_a[action] * N_total
+            else:
+                U = Node.c_puct * child.P * N_total / (1 + child.N)
+                value = child.Q + U
 
             if value > best_value:
                 best_action = action
                 best_value = value
 
-        return self.edges[best_action]
+        return best_action
 
     def evaluate(self):
         P_a_logit, V = Node.model.eval(self.my, self.opp, self.obs)
-        P_a_logit = P_a_logit[0]
+        return self.interpret(P_a_logit[0], V[0])
+
+    def interpret(self, P_a_logit, V):
+        """Priors and value for this node from the network outputs."""
         P_a = 1 / (1 + np.exp(-P_a_logit))
-        V = V[0]
 
         if self.terminal:
             my_score = bitop.popcount(self.my)
@@ -92,18 +199,11 @@ class Node:
 
         return P_a, V
 
-    def expand(self):
+    def expand(self, evaluation=None):
         self.leaf = False
-        P_a, V = self.evaluate()
-
-        if self.my_moves:
-            for action in range(8 * 8):
-                if self.my_moves & (1 << action):
-                    my, opp = bitop.resolve_move(self.my, self.opp, action)
-                    self.edges[action] = Node(self, opp, my, self.obs, -self.turn, P_a[action])
-        elif self.opp_moves:
-            self.edges[64] = Node(self, self.opp, self.my, self.obs, -self.turn, P_a[64])
+        P_a, V = self.evaluate() if evaluation is None else evaluation
 
+        self.P_a = P_a
         self.V = V
 
     def backup(self):
@@ -118,7 +218,7 @@ class Node:
         pass
 
     def __repr__(self):
-        my = self.
+        my = self.my
         opp = self.opp
 
         if self.turn == -1:
@@ -127,21 +227,44 @@ class Node:
         return bitop.to_string(my, opp, self.obs)
 
 
+def load_model(engine, model_id):
+    """The network to search with: 'keras' for ResidualCNN, 'fused' for the
+    NumPy engine exported by neural.fused, or 'int8' or 'float16' for a
+    neural.quantized model. Only 'keras' imports Keras."""
+    if engine == 'keras':
+        from neural.model import ResidualCNN
+        model = ResidualCNN()
+    elif engine == 'fused':
+        model = FusedCNN()
+    else:
+        model = QuantizedCNN(engine)
+
+    model.load(model_id)
+    return model
+
+
 class MTCS:
-    def __init__(self, c_puct, simul_N, model_id):
+    def __init__(self, c_puct, simul_N, model_id, batch_size=1, cache_size=1 << 16, symmetric=False,
+                 engine='keras'):
         Node.c_puct = c_puct
         Node.simul_N = simul_N
+        Node.batch_size = batch_size
 
-        Node.model = ResidualCNN()
-        Node.model.load(model_id)
+        Node.model = load_model(engine, model_id)
+        if cache_size:
+            Node.model = EvalCache(Node.model, cache_size, symmetric)
 
-    def run(self, my, opp, obs):
+    def run(self, my, opp, obs, budget=None):
         self.root = Node(None, my, opp, obs)
-        action = self.root.best_move_mcts()
+        action = self.root.best_move_mcts(budget)
         return action
 
-mtcs = MTCS(c_puct=0.05, simul_N=100, model_id=0)
+# Built on first use, so that importing this module loads no model.
+mtcs = None
 
-def run(my, opp, obs):
-    return mtcs.run(my, opp, obs)
+def run(my, opp, obs, budget=None):
+    global mtcs
+    if mtcs is None:
+        mtcs = MTCS(c_puct=0.05, simul_N=100, model_id=0, batch_size=8)
+    return mtcs.run(my, opp, obs, budget)
 
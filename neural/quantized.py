@@ -0,0 +1,183 @@
+import time
+
+import numpy as np
+
+import game.codec as codec
+from neural.fused import FusedCNN, conv2d
+
+
+# Reduced-precision variants of FusedCNN.
+#
+# 'int8' stores each kernel as int8 with a scale per output channel, and
+# quantizes the input of every layer to int8 with a per-tensor scale found by
+# calibrate(). The integer products are summed in float32, which is exact
+# here: no layer sums more than 3 * 3 * 36 products of at most 127 * 127,
+# well under 2 ** 24. 'float16' stores weights in float16 and rounds the
+# input of every layer to float16, accumulating in float32.
+#
+# NumPy has no fast int8 or float16 matrix product, so the products run in
+# float32 on kernels widened once, when the weights are set. These modes
+# shrink the saved weights (by 4x and 2x) and model the accuracy of hardware
+# with int8 or float16 arithmetic; they are not faster than FusedCNN, and
+# hold the widened kernels in memory next to the stored ones. latency() and
+# weight_bytes() measure both.
+
+quantized_path = 'weights/{}_{}.npz'
+
+MODES = ('int8', 'float16')
+INT8_MAX = 127
+
+
+def quantize_per_channel(kernel):
+    """int8 kernel and float32 scale per output channel (last axis)."""
+    max_abs = np.abs(kernel).reshape(-1, kernel.shape[-1]).max(axis=0)
+    scale = np.where(max_abs > 0, max_abs / INT8_MAX, 1).astype(np.float32)
+    return np.round(kernel / scale).astype(np.int8), scale
+
+
+class RangeRecorder(FusedCNN):
+    """FusedCNN that records the largest absolute input seen by each layer."""
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.ranges = {}
+
+    def record(self, name, x):
+        self.ranges[name] = max(self.ranges.get(name, 0.0), float(np.abs(x).max()))
+
+    def conv(self, x, n):
+        self.record(f'conv{n}', x)
+        return super().conv(x, n)
+
+    def dense(self, x, name):
+        self.record(name, x)
+        return super().dense(x, name)
+
+
+def calibrate(fused, positions, batch_size=256):
+    """Largest absolute input of each layer of a FusedCNN over positions, a
+    codec.POSITION_DTYPE array."""
+    recorder = RangeRecorder(fused.params)
+    for start in range(0, len(positions), batch_size):
+        batch = positions[start:start + batch_size]
+        recorder.eval_batch(list(zip(batch['my'], batch['opp'], batch['obs'])))
+    return recorder.ranges
+
+
+class QuantizedCNN(FusedCNN):
+    """FusedCNN in one of MODES, built with from_fused or loaded from
+    weights/<mode>_<id>.npz."""
+
+    def __init__(self, mode='int8', params=None):
+        if mode not in MODES:
+            raise ValueError(f'unknown mode {mode!r}')
+        super().__init__(params)
+        self.mode = mode
+        self.kernels = {}
+        if params is not None:
+            self.widen()
+
+    def widen(self):
+        """Widen the stored kernels to float32 for the products."""
+        self.kernels = {key[:-len('_kernel')]: value.astype(np.float32)
+                        for key, value in self.params.items() if key.endswith('_kernel')}
+
+    @staticmethod
+    def from_fused(fused, mode='int8', positions=None):
+        """Quantize a FusedCNN. int8 needs calibration positions."""
+        params = {}
+        if mode == 'float16':
+            for key, value in fused.params.items():
+                params[key] = np.asarray(value, dtype=np.float16)
+            return QuantizedCNN(mode, params)
+
+        ranges = calibrate(fused, positions)
+        for key, value in fused.params.items():
+            if key.endswith('_kernel'):
+                name = key[:-len('_kernel')]
+                params[key], params[f'{name}_scale'] = quantize_per_channel(value)
+                params[f'{name}_input_scale'] = np.float32(max(ranges[name], 1e-6) / INT8_MAX)
+            else:
+                params[key] = value
+        return QuantizedCNN(mode, params)
+
+    def load(self, id):
+        with np.load(quantized_path.format(self.mode, id)) as data:
+            self.params = dict(data)
+        self.widen()
+
+    def save(self, id):
+        np.savez(quantized_path.format(self.mode, id), **self.params)
+
+    def layer(self, x, name, product):
+        kernel, bias = self.kernels[name], self.params[f'{name}_bias']
+
+        if self.mode == 'float16':
+            return product(x.astype(np.float16).astype(np.float32), kernel) + bias
+
+        # The int8 levels of the input, kept in float32 for the product.
+        input_scale = self.params[f'{name}_input_scale']
+        levels = np.clip(np.round(x / input_scale), -INT8_MAX, INT8_MAX)
+        return product(levels, kernel) * (input_scale * self.params[f'{name}_scale']) + bias
+
+    def conv(self, x, n):
+        return self.layer(x, f'conv{n}', lambda x, kernel: conv2d(x, kernel, 0))
+
+    def dense(self, x, name):
+        return self.layer(x, name, lambda x, kernel: x @ kernel)
+
+
+def drift(reference, model, positions):
+    """Accuracy of model against reference on positions: largest and mean
+    absolute error of the policy logits and of the value, and how often the
+    two agree on the top policy move."""
+    batch = list(zip(positions['my'], positions['opp'], positions['obs']))
+    ref_policy, ref_value = reference.eval_batch(batch)
+    policy, value = model.eval_batch(batch)
+
+    return {
+        'policy_max': float(np.abs(policy - ref_policy).max()),
+        'policy_mean': float(np.abs(policy - ref_policy).mean()),
+        'policy_top1': float(np.mean(policy.argmax(axis=1) == ref_policy.argmax(axis=1))),
+        'value_max': float(np.abs(value - ref_value).max()),
+        'value_mean': float(np.abs(value - ref_value).mean()),
+    }
+
+
+def weight_bytes(model):
+    """Bytes of the stored parameters, as saved, and of everything held at
+    run time, including a QuantizedCNN's widened kernels."""
+    stored = sum(value.nbytes for value in model.params.values())
+    widened = sum(value.nbytes for value in getattr(model, 'kernels', {}).values())
+    return stored, stored + widened
+
+
+def latency(model, positions, N=200):
+    """Mean single-position eval_batch latency in seconds."""
+    batch = list(zip(positions['my'][:1], positions['opp'][:1], positions['obs'][:1]))
+    model.eval_batch(batch)
+    start = time.perf_counter()
+    for _ in range(N):
+        model.eval_batch(batch)
+    return (time.perf_counter() - start) / N
+
+
+if __name__ == '__main__':
+    import sys
+
+    model_id, positions_path = int(sys.argv[1]), sys.argv[2]
+    positions = codec.load_positions(positions_path)
+    calibration, held_out = positions[:len(positions) // 2], positions[len(positions) // 2:]
+
+    def report(name, model):
+        stored, runtime = weight_bytes(model)
+        return f'{name}: {latency(model, held_out) * 1e3:.3f} ms, {stored} bytes stored, {runtime} bytes at run time'
+
+    fused = FusedCNN()
+    fused.load(model_id)
+    print(report('float32', fused))
+
+    for mode in MODES:
+        model = QuantizedCNN.from_fused(fused, mode, calibration)
+        model.save(model_id)
+        print(report(mode, model), drift(fused, model, held_out))
@@ -0,0 +1,51 @@
+import engines.endgame as endgame
+import game.bitboard as bitop
+import game.util as util
+from test.test_bitboard import random_positions
+
+
+# Test positions shared by the engine tests.
+
+
+def opening():
+    return bitop.array_to_bits(util.initial_setup())
+
+
+def find_positions(condition, count, N=5000):
+    """Up to count positions (my, opp, obs) from N random positions for
+    which condition(my, opp, obs) holds."""
+    my_arr, opp_arr, obs = random_positions(N)
+
+    positions = []
+    for my, opp in zip(my_arr, opp_arr):
+        if condition(my, opp, obs):
+            positions.append((my, opp, obs))
+            if len(positions) == count:
+                break
+    return positions
+
+
+def find_position(condition, N=5000):
+    positions = find_positions(condition, 1, N)
+    if not positions:
+        raise AssertionError('no position found')
+    return positions[0]
+
+
+def has_moves(N):
+    """Condition for positions where the player to move has at least N
+    moves."""
+    return lambda my, opp, obs: bitop.popcount(bitop.generate_moves(my, opp, obs)) >= N
+
+
+def endgame_positions(max_empty, count=20):
+    """Positions with at most max_empty empty cells and at least two moves."""
+    return find_positions(lambda my, opp, obs: endgame.count_empty(my, opp, obs) <= max_empty
+                          and has_moves(2)(my, opp, obs), count)
+
+
+def endgame_position(empty):
+    """A position with the given number of empty squares and at least two
+    moves."""
+    return find_position(lambda my, opp, obs: endgame.count_empty(my, opp, obs) == empty
+                         and has_moves(2)(my, opp, obs))
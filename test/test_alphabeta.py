@@ -0,0 +1,90 @@
+import time
+import unittest
+
+import engines.alphabeta as alphabeta
+import engines.endgame as endgame
+import game.bitboard as bitop
+from engines.budget import Budget
+from test.positions import endgame_positions, opening
+from test.test_bitboard import random_positions
+
+
+def move_value(my, opp, obs, move):
+    new_my, new_opp = bitop.resolve_move(my, opp, move)
+    _, score = endgame.solve(new_opp, new_my, obs)
+    return -score
+
+
+def exact_score(diff):
+    """alphabeta's score for a finished game with disk differential diff."""
+    if diff == 0:
+        return 0
+    return (alphabeta.WIN_SCORE if diff > 0 else -alphabeta.WIN_SCORE) + alphabeta.DISK_SCORE * diff
+
+
+class AlphaBetaTests(unittest.TestCase):
+    def test_matches_endgame_solver(self):
+        positions = endgame_positions(9)
+        self.assertGreater(len(positions), 0)
+
+        for my, opp, obs in positions:
+            empty = endgame.count_empty(my, opp, obs)
+            move, score, completed = alphabeta.search(my, opp, obs, max_depth=empty)
+            _, expected = endgame.solve(my, opp, obs)
+
+            # A proven win or loss can stop the search before the last
+            # depth; only its sign is then exact.
+            if completed >= empty:
+                self.assertEqual(score, exact_score(expected))
+                self.assertEqual(move_value(my, opp, obs, move), expected)
+            else:
+                self.assertGreaterEqual(abs(score), alphabeta.WIN_SCORE)
+                self.assertEqual(score > 0, expected > 0)
+                self.assertEqual(move_value(my, opp, obs, move) > 0, expected > 0)
+
+    def test_node_budget(self):
+        my, opp, obs = opening()
+        budget = Budget(simulations=2000)
+
+        move, _, completed = alphabeta.search(my, opp, obs, max_depth=20, budget=budget)
+
+        self.assertLessEqual(budget.done, 2000)
+        self.assertLess(completed, 20)
+        self.assertTrue(bitop.generate_moves(my, opp, obs) & (1 << move))
+
+    def test_time_budget(self):
+        my, opp, obs = opening()
+        budget = Budget(time_limit=0.2)
+
+        start = time.perf_counter()
+        move, _, completed = alphabeta.search(my, opp, obs, max_depth=30, budget=budget)
+
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertGreater(completed, 0)
+        self.assertTrue(bitop.generate_moves(my, opp, obs) & (1 << move))
+
+    def test_forced_move(self):
+        my_arr, opp_arr, obs = random_positions(5000)
+
+        tested = 0
+        for my, opp in zip(my_arr, opp_arr):
+            moves = bitop.generate_moves(my, opp, obs)
+            if bitop.popcount(moves) > 1 or bitop.is_terminated(my, opp, obs):
+                continue
+
+            budget = Budget()
+            move, _, completed = alphabeta.search(my, opp, obs, budget=budget)
+
+            self.assertEqual(move, bitop.bit_index(moves) if moves else alphabeta.PASS)
+            self.assertEqual(completed, 0)
+            self.assertEqual(budget.done, 0)
+
+            tested += 1
+            if tested == 10:
+                break
+
+        self.assertGreater(tested, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,17 @@
 import unittest
 
 import game.bitboard as bitop
+import game.util as util
+from game.benchmark import sample_positions
 import numpy as np
 
 
+def random_positions(N=2000):
+    my, opp, obs = bitop.array_to_bits(util.initial_setup())
+    my_arr, opp_arr = sample_positions(my, opp, obs, N)
+    return my_arr, opp_arr, obs
+
+
 class BitBoardTests(unittest.TestCase):
     def test_pack_one(self):
         arr = np.zeros((8, 8), dtype=np.uint64)
@@ -44,3 +52,136 @@ class BitBoardTests(unittest.TestCase):
 
         self.assertEqual(my_disks, 7)
         self.assertEqual(opp_disks, 0)
+
+    def test_generate_moves_kogge_stone(self):
+        my_arr, opp_arr, obs = random_positions()
+
+        for my, opp in zip(my_arr, opp_arr):
+            self.assertEqual(bitop.generate_moves_kogge_stone(my, opp, obs),
+                             bitop.generate_moves(my, opp, obs))
+
+    def test_resolve_move_kogge_stone(self):
+        my_arr, opp_arr, obs = random_positions()
+
+        for my, opp in zip(my_arr, opp_arr):
+            moves = bitop.generate_moves(my, opp, obs)
+            for i in range(8 * 8):
+                if moves & (1 << i):
+                    self.assertEqual(bitop.resolve_move_kogge_stone(my, opp, i),
+                                     bitop.resolve_move(my, opp, i))
+
+    def test_batch_operations(self):
+        my_arr, opp_arr, obs = random_positions()
+        obs_arr = np.full(len(my_arr), obs, dtype=np.uint64)
+
+        moves = bitop.generate_moves_batch(my_arr, opp_arr, obs_arr)
+        terminated = bitop.is_terminated_batch(my_arr, opp_arr, obs_arr)
+        scores = bitop.evaluate_batch(my_arr, opp_arr, obs_arr)
+        counts = bitop.popcount_batch(my_arr)
+
+        for n, (my, opp) in enumerate(zip(my_arr, opp_arr)):
+            self.assertEqual(moves[n], bitop.generate_moves(my, opp, obs))
+            self.assertEqual(terminated[n], bitop.is_terminated(my, opp, obs))
+            self.assertEqual(scores[n], bitop.evaluate(my, opp, obs))
+            self.assertEqual(counts[n], bitop.popcount(my))
+
+    def test_resolve_move_batch(self):
+        my_arr, opp_arr, obs = random_positions()
+        moves = bitop.generate_moves_batch(my_arr, opp_arr, np.full(len(my_arr), obs, dtype=np.uint64))
+
+        has_move = moves != 0
+        my_arr, opp_arr, moves = my_arr[has_move], opp_arr[has_move], moves[has_move]
+        idx = np.array([int(m).bit_length() - 1 for m in moves], dtype=np.int32)
+
+        my_res, opp_res = bitop.resolve_move_batch(my_arr, opp_arr, idx)
+
+        for n in range(len(idx)):
+            self.assertEqual((my_res[n], opp_res[n]),
+                             bitop.resolve_move(my_arr[n], opp_arr[n], idx[n]))
+
+    def test_bit_index(self):
+        self.assertEqual(bitop.bit_index(12), 2)
+        self.assertEqual(bitop.bit_index(1 << 63), 63)
+        self.assertEqual(bitop.bit_index(0), 64)
+
+    def test_bit_indices(self):
+        res = bitop.bit_indices(0b1010011 | (1 << 63))
+
+        self.assertEqual(res.tolist(), [0, 1, 4, 6, 63])
+
+    def test_kth_bit(self):
+        self.assertEqual(bitop.kth_bit(0b10110, 0), 1)
+        self.assertEqual(bitop.kth_bit(0b10110, 2), 4)
+
+    def test_random_bit(self):
+        seen = {bitop.random_bit(0b1011001) for _ in range(1000)}
+
+        self.assertEqual(seen, {0, 3, 4, 6})
+
+    def test_flips(self):
+        rng = np.random.default_rng(0)
+
+        for bits in rng.integers(0, 2 ** 64, size=100, dtype=np.uint64):
+            arr = bitop.unpack(bits)
+
+            self.assertTrue(np.array_equal(bitop.unpack(bitop.flip_vertical(bits)), arr[::-1]))
+            self.assertTrue(np.array_equal(bitop.unpack(bitop.flip_horizontal(bits)), arr[:, ::-1]))
+            self.assertTrue(np.array_equal(bitop.unpack(bitop.flip_diagonal(bits)), arr.T))
+
+    def test_transform(self):
+        bits = np.uint64(0x0000102040A08103)
+
+        variants = set()
+        for t in range(bitop.NUM_TRANSFORMS):
+            x = bitop.transform(bits, t)
+            variants.add(int(x))
+
+            self.assertEqual(bitop.transform(x, bitop.INVERSE_TRANSFORMS[t]), bits)
+            for i in range(8 * 8):
+                self.assertEqual(bool(x & (1 << bitop.transform_square(i, t))), bool(bits & (1 << i)))
+
+        self.assertEqual(len(variants), bitop.NUM_TRANSFORMS)
+
+    def test_canonical(self):
+        my_arr, opp_arr, obs = random_positions(200)
+
+        for my, opp in zip(my_arr, opp_arr):
+            res = bitop.canonical(my, opp, obs)
+            c_my, c_opp, c_obs, t = res
+
+            self.assertEqual((c_my, c_opp, c_obs),
+                             tuple(bitop.transform(x, t) for x in (my, opp, obs)))
+            for s in range(bitop.NUM_TRANSFORMS):
+                variant = tuple(bitop.transform(x, s) for x in (my, opp, obs))
+                self.assertEqual(bitop.canonical(*variant)[:3], res[:3])
+                self.assertLessEqual(res[:3], variant)
+
+        obs_arr = np.full(len(my_arr), obs, dtype=np.uint64)
+        c_my, c_opp, c_obs, t = bitop.canonical_batch(my_arr, opp_arr, obs_arr)
+        for n in range(len(my_arr)):
+            self.assertEqual((c_my[n], c_opp[n], c_obs[n], t[n]),
+                             bitop.canonical(my_arr[n], opp_arr[n], obs))
+
+    def test_stable_disks(self):
+        self.assertEqual(bitop.stable_disks(1, 0, 0), 1)
+        self.assertEqual(bitop.stable_disks(1 << 9, 0, 0), 0)
+        self.assertEqual(bitop.stable_disks(1 << 9, 0, ~np.uint64(1 << 9)), 1 << 9)
+
+    def test_stable_disks_never_flip(self):
+        my_arr, opp_arr, obs = random_positions(3000)
+
+        for my, opp in zip(my_arr[::10], opp_arr[::10]):
+            my_stable = bitop.stable_disks(my, opp, obs)
+            opp_stable = bitop.stable_disks(opp, my, obs)
+
+            for _ in range(5):
+                a, b, swapped = my, opp, False
+                while not bitop.is_terminated(a, b, obs):
+                    moves = bitop.generate_moves(a, b, obs)
+                    if moves:
+                        a, b = bitop.resolve_move(a, b, bitop.random_bit(moves))
+                    a, b, swapped = b, a, not swapped
+
+                    mine, theirs = (b, a) if swapped else (a, b)
+                    self.assertEqual(mine & my_stable, my_stable)
+                    self.assertEqual(theirs & opp_stable, opp_stable)
@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+
+import game.bitboard as bitop
+from neural.cache import EvalCache
+from test.test_bitboard import random_positions
+
+
+class BoardModel:
+    """Stand-in for ResidualCNN whose outputs transform with the board."""
+
+    def __init__(self):
+        self.evaluated = 0
+
+    def eval_batch(self, positions):
+        self.evaluated += len(positions)
+        policies = np.zeros((len(positions), 8 * 8 + 1), dtype=np.float32)
+        values = np.zeros((len(positions), 1), dtype=np.float32)
+
+        for n, (my, opp, obs) in enumerate(positions):
+            for row, bits in enumerate((my, opp, obs)):
+                policies[n, bitop.bit_indices(bits)] = row + 1
+            policies[n, 64] = bitop.popcount(my)
+            values[n] = bitop.popcount(my) - bitop.popcount(opp)
+        return policies, values
+
+
+class EvalCacheTests(unittest.TestCase):
+    def test_symmetric_hits(self):
+        model = BoardModel()
+        cache = EvalCache(model, symmetric=True)
+        my_arr, opp_arr, obs = random_positions(50)
+
+        for my, opp in zip(my_arr, opp_arr):
+            cache.eval(my, opp, obs)
+            for t in range(1, bitop.NUM_TRANSFORMS):
+                position = bitop.transform(my, t), bitop.transform(opp, t), bitop.transform(obs, t)
+                policy, value = cache.eval(*position)
+                expected_policy, expected_value = model.eval_batch([position])
+
+                np.testing.assert_array_equal(policy, expected_policy)
+                np.testing.assert_array_equal(value, expected_value)
+
+        canonical = {bitop.canonical(my, opp, obs)[:3] for my, opp in zip(my_arr, opp_arr)}
+        self.assertEqual(cache.misses, len(canonical))
+        self.assertEqual(cache.hits + cache.misses, 50 * bitop.NUM_TRANSFORMS)
+
+    def test_not_symmetric_by_default(self):
+        model = BoardModel()
+        cache = EvalCache(model)
+        my_arr, opp_arr, obs = random_positions(10)
+
+        for my, opp in zip(my_arr, opp_arr):
+            for t in range(bitop.NUM_TRANSFORMS):
+                position = bitop.transform(my, t), bitop.transform(opp, t), bitop.transform(obs, t)
+                policy, value = cache.eval(*position)
+                expected_policy, expected_value = model.eval_batch([position])
+
+                np.testing.assert_array_equal(policy, expected_policy)
+                np.testing.assert_array_equal(value, expected_value)
+
+    def test_lru_eviction(self):
+        model = BoardModel()
+        cache = EvalCache(model, size=2, symmetric=False)
+        my_arr, opp_arr, obs = random_positions(50)
+        a, b, c = [(my, opp, obs) for my, opp in sorted(set(zip(my_arr.tolist(), opp_arr.tolist())))[:3]]
+
+        cache.eval(*a)
+        cache.eval(*b)
+        cache.eval(*a)
+        cache.eval(*c)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+        cache.eval(*a)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        cache.eval(*b)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_batch(self):
+        model = BoardModel()
+        cache = EvalCache(model, symmetric=False)
+        my_arr, opp_arr, obs = random_positions(20)
+        positions = [(my, opp, obs) for my, opp in zip(my_arr, opp_arr)]
+
+        policies, values = cache.eval_batch(positions + positions)
+        expected_policies, expected_values = BoardModel().eval_batch(positions + positions)
+
+        np.testing.assert_array_equal(policies, expected_policies)
+        np.testing.assert_array_equal(values, expected_values)
+        self.assertEqual(model.evaluated, len(set(zip(my_arr.tolist(), opp_arr.tolist()))))
+
+
+if __name__ == '__main__':
+    unittest.main()
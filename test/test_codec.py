@@ -0,0 +1,73 @@
+import unittest
+
+import game.bitboard as bitop
+import game.codec as codec
+import game.util as util
+import numpy as np
+
+
+def random_game():
+    _, _, obs = bitop.array_to_bits(util.initial_setup())
+    my, opp = codec.INITIAL_MY, codec.INITIAL_OPP
+
+    positions, moves = [(my, opp)], []
+    while not bitop.is_terminated(my, opp, obs):
+        my_moves = bitop.generate_moves(my, opp, obs)
+        if my_moves:
+            i = bitop.random_bit(my_moves)
+            my, opp = bitop.resolve_move(my, opp, i)
+            moves.append(i)
+        else:
+            moves.append(codec.PASS)
+        my, opp = opp, my
+        positions.append((my, opp))
+
+    return obs, moves, positions
+
+
+class CodecTests(unittest.TestCase):
+    def test_position_roundtrip(self):
+        buf = codec.encode_position(1, 2, 1 << 63)
+
+        self.assertEqual(len(buf), codec.POSITION_SIZE)
+        self.assertEqual(codec.decode_position(buf), (1, 2, 1 << 63))
+
+    def test_positions_roundtrip(self):
+        rng = np.random.default_rng(0)
+        my, opp, obs = rng.integers(0, 2 ** 64, size=(3, 100), dtype=np.uint64)
+        positions = codec.positions_from_bits(my, opp, obs)
+
+        buf = codec.encode_positions(positions)
+        decoded = codec.decode_positions(buf)
+
+        self.assertEqual(len(buf), 100 * codec.POSITION_SIZE)
+        self.assertTrue(np.array_equal(decoded, positions))
+
+    def test_games_roundtrip(self):
+        games = [random_game() for _ in range(10)]
+
+        buf = codec.encode_games((obs, moves) for obs, moves, _ in games)
+        decoded = codec.decode_games(buf)
+
+        self.assertEqual(len(decoded), len(games))
+        for (obs, moves, positions), (d_obs, d_moves) in zip(games, decoded):
+            self.assertEqual(obs, d_obs)
+            self.assertEqual(d_moves.tolist(), [m for m in moves if m != codec.PASS])
+
+            replayed, _ = codec.replay_game(d_obs, d_moves)
+            expected = [p for p, m in zip(positions, moves + [None]) if m != codec.PASS]
+            self.assertEqual(list(zip(replayed['my'], replayed['opp'])), expected)
+
+    def test_truncated_games(self):
+        buf = codec.encode_games([random_game()[:2] for _ in range(3)])
+        last = len(codec.encode_games(codec.decode_games(buf)[:2]))
+
+        for end in (last + 1, last + codec.RECORD_HEADER_SIZE, len(buf) - 1):
+            with self.assertRaises(ValueError):
+                codec.decode_games(buf[:end])
+        self.assertEqual(len(codec.decode_games(buf[:last])), 2)
+
+    def test_string_roundtrip(self):
+        s = bitop.to_string(1, 2, 1 << 63)
+
+        self.assertEqual(bitop.from_string(s), (1, 2, 1 << 63))
@@ -0,0 +1,85 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import engines.endgame as endgame
+import engines.mcts as mcts
+import game.bitboard as bitop
+from engines.budget import Budget
+from test.positions import endgame_position
+from test.test_bitboard import random_positions
+
+
+def minimax(my, opp, obs, passed=False):
+    moves = bitop.generate_moves(my, opp, obs)
+    if not moves:
+        if passed:
+            return bitop.evaluate(my, opp, obs)
+        return -minimax(opp, my, obs, True)
+
+    best = None
+    for i in bitop.bit_indices(moves).tolist():
+        new_my, new_opp = bitop.resolve_move(my, opp, i)
+        score = -minimax(new_opp, new_my, obs)
+        best = score if best is None else max(best, score)
+    return best
+
+
+class EndgameTests(unittest.TestCase):
+    def test_solve(self):
+        my_arr, opp_arr, obs = random_positions(5000)
+
+        solved = 0
+        for my, opp in zip(my_arr, opp_arr):
+            if endgame.count_empty(my, opp, obs) > 8 or bitop.is_terminated(my, opp, obs):
+                continue
+
+            move, score = endgame.solve(my, opp, obs)
+            expected = minimax(my, opp, obs)
+            self.assertEqual(score, expected)
+
+            if move == endgame.PASS:
+                self.assertEqual(bitop.generate_moves(my, opp, obs), 0)
+            else:
+                new_my, new_opp = bitop.resolve_move(my, opp, move)
+                self.assertEqual(-minimax(new_opp, new_my, obs), expected)
+
+            solved += 1
+            if solved == 30:
+                break
+
+        self.assertGreater(solved, 0)
+
+    def test_node_limit(self):
+        my, opp, obs = endgame_position(12)
+        move, score = endgame.solve(my, opp, obs)
+
+        stats = np.zeros(endgame.NUM_STATS, dtype=np.int64)
+        self.assertEqual(endgame.solve_limited(my, opp, obs, stats), (move, score))
+        self.assertFalse(stats[endgame.ABORTED])
+        nodes = stats[endgame.NODES]
+
+        stats[:] = 0
+        stats[endgame.NODE_LIMIT] = nodes // 2
+        endgame.solve_limited(my, opp, obs, stats)
+        self.assertTrue(stats[endgame.ABORTED])
+        self.assertEqual(stats[endgame.NODES], nodes // 2)
+
+    def test_run_within_budget(self):
+        my, opp, obs = endgame_position(12)
+        move, _ = endgame.solve(my, opp, obs)
+
+        self.assertEqual(endgame.run(my, opp, obs, Budget(simulations=1)), move)
+        self.assertEqual(endgame.run(my, opp, obs, Budget(time_limit=60)), move)
+
+        with mock.patch.object(endgame, 'node_rate', 10):
+            self.assertIsNone(endgame.run(my, opp, obs, Budget(time_limit=1)))
+
+    def test_engine_falls_back_to_search(self):
+        my, opp, obs = endgame_position(14)
+
+        with mock.patch.object(endgame, 'node_rate', 10):
+            move = mcts.run(my, opp, obs, Budget(time_limit=0.1))
+        self.assertIn(move, bitop.bit_indices(bitop.generate_moves(my, opp, obs)).tolist())
+
@@ -0,0 +1,114 @@
+import importlib.util
+import unittest
+
+import numpy as np
+
+import neural.fused as fused
+from neural.fused import FusedCNN
+from test.test_bitboard import random_positions
+
+
+def random_layers(rng, n_blocks=2, filters=36):
+    """Unfused parameters: (kernel, bias, batch norm) per convolution, in
+    FusedCNN's order, and the dense layers."""
+    def conv(size, channels, out):
+        norm = (rng.uniform(0.5, 1.5, out), rng.normal(0, 0.1, out),
+                rng.normal(0, 0.1, out), rng.uniform(0.5, 1.5, out))
+        return rng.normal(0, 0.1, (size, size, channels, out)), rng.normal(0, 0.1, out), norm
+
+    convs = [conv(3, 3, filters)]
+    convs += [conv(3, filters, filters) for _ in range(2 * n_blocks)]
+    convs += [conv(1, filters, 2), conv(1, filters, 1)]
+
+    dense = {
+        'policy': (rng.normal(0, 0.1, (2 * 8 * 8, 8 * 8 + 1)), rng.normal(0, 0.1, 8 * 8 + 1)),
+        'value_hidden': (rng.normal(0, 0.1, (8 * 8, 36)), rng.normal(0, 0.1, 36)),
+        'value': (rng.normal(0, 0.1, (36, 1)), rng.normal(0, 0.1, 1)),
+    }
+    return convs, dense
+
+
+def reference_forward(convs, dense, x, alpha, epsilon):
+    def conv_bn(x, n):
+        kernel, bias, (gamma, beta, mean, var) = convs[n]
+        y = fused.conv2d(x, kernel, bias)
+        return gamma * (y - mean) / np.sqrt(var + epsilon) + beta
+
+    x = fused.leaky_relu(conv_bn(x, 0), alpha)
+    for n in range(1, len(convs) - 2, 2):
+        y = fused.leaky_relu(conv_bn(x, n), alpha)
+        x = fused.leaky_relu(conv_bn(y, n + 1) + x, alpha)
+
+    policy = fused.leaky_relu(conv_bn(x, len(convs) - 2), alpha).reshape(len(x), -1)
+    policy = policy @ dense['policy'][0] + dense['policy'][1]
+
+    value = fused.leaky_relu(conv_bn(x, len(convs) - 1), alpha).reshape(len(x), -1)
+    value = np.maximum(value @ dense['value_hidden'][0] + dense['value_hidden'][1], 0)
+    value = np.tanh(value @ dense['value'][0] + dense['value'][1])
+    return policy, value
+
+
+class FusedTests(unittest.TestCase):
+    def test_conv2d(self):
+        rng = np.random.default_rng(0)
+        x = rng.normal(size=(2, 8, 8, 3))
+        kernel = rng.normal(size=(3, 3, 3, 4))
+        bias = rng.normal(size=4)
+
+        res = fused.conv2d(x, kernel, bias)
+
+        padded = np.pad(x, ((0, 0), (1, 1), (1, 1), (0, 0)))
+        for b, row, col, f in [(0, 0, 0, 0), (1, 3, 7, 2), (0, 7, 4, 3)]:
+            expected = np.sum(padded[b, row:row + 3, col:col + 3, :] * kernel[..., f]) + bias[f]
+            self.assertAlmostEqual(res[b, row, col, f], expected)
+
+    def test_fused_matches_unfused(self):
+        rng = np.random.default_rng(1)
+        convs, dense = random_layers(rng)
+        alpha, epsilon = 0.3, 1e-3
+
+        params = {'alpha': alpha}
+        for n, (kernel, bias, norm) in enumerate(convs):
+            params[f'conv{n}_kernel'], params[f'conv{n}_bias'] = fused.fold_batch_norm(kernel, bias, *norm, epsilon)
+        for name, (kernel, bias) in dense.items():
+            params[f'{name}_kernel'], params[f'{name}_bias'] = kernel, bias
+        model = FusedCNN(params)
+
+        my_arr, opp_arr, obs = random_positions(16)
+        positions = list(zip(my_arr, opp_arr, [obs] * len(my_arr)))
+        x = np.stack([FusedCNN.to_input(*position) for position in positions])
+
+        policy, value = model.eval_batch(positions)
+        expected_policy, expected_value = reference_forward(convs, dense, x, alpha, epsilon)
+
+        np.testing.assert_allclose(policy, expected_policy, atol=1e-9)
+        np.testing.assert_allclose(value, expected_value, atol=1e-9)
+
+        single_policy, single_value = model.eval(*positions[3])
+        np.testing.assert_allclose(single_policy[0], policy[3])
+        np.testing.assert_allclose(single_value[0], value[3])
+
+    @unittest.skipUnless(importlib.util.find_spec('keras'), 'keras is not installed')
+    def test_export_matches_keras(self):
+        from neural.model import ResidualCNN
+
+        model = ResidualCNN()
+        rng = np.random.default_rng(2)
+        for layer in model.model.layers:
+            if type(layer).__name__ == 'BatchNormalization':
+                gamma, beta, mean, var = layer.get_weights()
+                layer.set_weights([rng.uniform(0.5, 1.5, gamma.shape), rng.normal(0, 0.1, beta.shape),
+                                   rng.normal(0, 0.1, mean.shape), rng.uniform(0.5, 1.5, var.shape)])
+
+        my_arr, opp_arr, obs = random_positions(16)
+        positions = list(zip(my_arr, opp_arr, [obs] * len(my_arr)))
+
+        policy, value = fused.export(model).eval_batch(positions)
+        expected_policy, expected_value = model.eval_batch(positions)
+
+        np.testing.assert_allclose(policy, expected_policy, atol=1e-4)
+        np.testing.assert_allclose(value, expected_value, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import game.bitboard as bitop
+import game.codec as codec
+import neural.generator as generator
+from neural.nn import Node
+from test.test_quantized import random_fused
+
+
+class GeneratorTests(unittest.TestCase):
+    def setUp(self):
+        Node.c_puct = 0.05
+        Node.simul_N = 8
+        Node.batch_size = 4
+        Node.model = random_fused(0)
+
+    def test_play_game(self):
+        obs, moves, visits = generator.play_game(np.random.default_rng(0))
+        positions, outcomes = generator.game_targets(obs, moves)
+
+        self.assertEqual(visits.shape, (len(moves), generator.NUM_ACTIONS))
+        self.assertEqual(len(positions), len(moves))
+        self.assertEqual(len(outcomes), len(moves))
+        self.assertTrue(np.all(visits.sum(axis=1) > 0))
+        for position, row, move in zip(positions, visits, moves):
+            legal = bitop.generate_moves(position['my'], position['opp'], position['obs'])
+            self.assertTrue(legal >> np.uint64(move) & np.uint64(1))
+            self.assertGreater(row[move], 0)
+            self.assertEqual(row[generator.NUM_ACTIONS - 1], 0)
+
+        # Both players' outcomes are opposite, and positions alternate unless
+        # someone passed.
+        self.assertTrue(set(np.unique(outcomes)) <= {-1, 0, 1})
+        _, turn = codec.replay_game(obs, moves)
+        for n in range(len(moves) - 1):
+            same = turn[n] == turn[n + 1]
+            self.assertEqual(outcomes[n], outcomes[n + 1] if same else -outcomes[n + 1])
+
+    def test_resume_skips_finished_shards(self):
+        game = generator.play_game(np.random.default_rng(1))
+        with tempfile.TemporaryDirectory() as out_dir:
+            for index in range(2):
+                generator.write_shard(os.path.join(out_dir, generator.shard_name(index)), [game])
+            stale = os.path.join(out_dir, generator.shard_name(2)) + '.tmp'
+            open(stale, 'wb').close()
+
+            written = generator.generate(2 * generator.shard_games, workers=1, out_dir=out_dir)
+
+            self.assertEqual(written, 0)
+            self.assertFalse(os.path.exists(stale))
+            positions, visits, outcomes = generator.load_shards(out_dir)
+            game_positions, game_outcomes = generator.game_targets(game[0], game[1])
+            np.testing.assert_array_equal(positions, np.concatenate([game_positions, game_positions]))
+            np.testing.assert_array_equal(visits, np.concatenate([game[2], game[2]]))
+            np.testing.assert_array_equal(outcomes, np.concatenate([game_outcomes, game_outcomes]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import game.bitboard as bitop
+import game.hashing as hashing
+from game.hashing import TranspositionTable
+from test.test_bitboard import random_positions
+
+
+class HashingTests(unittest.TestCase):
+    def test_side_to_move(self):
+        key_0 = hashing.hash_position(1, 2, 8, 0)
+        key_1 = hashing.hash_position(2, 1, 8, 1)
+
+        self.assertEqual(key_0 ^ key_1, hashing.ZOBRIST_SIDE)
+        self.assertNotEqual(key_0, hashing.hash_position(2, 1, 8, 0))
+
+    def test_hash_move(self):
+        my_arr, opp_arr, obs = random_positions(500)
+
+        for turn, (my, opp) in enumerate(zip(my_arr, opp_arr)):
+            turn %= 2
+            key = hashing.hash_position(my, opp, obs, turn)
+            moves = bitop.generate_moves(my, opp, obs)
+
+            for i in bitop.bit_indices(moves).tolist():
+                new_my, new_opp = bitop.resolve_move(my, opp, i)
+                new_key = hashing.hash_move(key, turn, i, opp ^ new_opp)
+
+                self.assertEqual(new_key, hashing.hash_position(new_opp, new_my, obs, turn ^ 1))
+
+            self.assertEqual(hashing.hash_move(key, turn, hashing.PASS, 0),
+                             hashing.hash_position(opp, my, obs, turn ^ 1))
+
+
+class TranspositionTableTests(unittest.TestCase):
+    def test_store_probe(self):
+        tt = TranspositionTable(10)
+        tt.store(12345, -17, 5, hashing.LOWER, 42)
+
+        self.assertEqual(tt.probe(12345), (True, -17, 5, hashing.LOWER, 42))
+        self.assertFalse(tt.probe(54321)[0])
+
+    def test_replacement(self):
+        tt = TranspositionTable(4)
+        deep, shallow, other = 1, 1 + (1 << 4), 1 + (2 << 4)
+
+        tt.store(deep, 1, 10, hashing.EXACT, 0)
+        tt.store(shallow, 2, 3, hashing.EXACT, 0)
+        tt.store(other, 3, 2, hashing.EXACT, 0)
+
+        self.assertTrue(tt.probe(deep)[0])
+        self.assertFalse(tt.probe(shallow)[0])
+        self.assertTrue(tt.probe(other)[0])
+
+        tt.new_search()
+        tt.store(shallow, 2, 3, hashing.EXACT, 0)
+
+        self.assertFalse(tt.probe(deep)[0])
+        self.assertTrue(tt.probe(shallow)[0])
@@ -0,0 +1,187 @@
+import queue
+import time
+import unittest
+from unittest import mock
+
+import engines.mcts100k as mcts100k
+import engines.mcts_node as mcts_node
+from engines.budget import Budget
+from test.positions import opening
+from test.test_mcts_node import count_nodes, settings
+
+
+class RootParallelTests(unittest.TestCase):
+    def test_merge_root_stats(self):
+        results = [
+            (10, {20: (3, 1.5, None), 29: (6, 3.0, None)}),
+            (12, {20: (5, 2.0, None), 29: (2, 2.0, 1), 34: (6, 1.0, None)}),
+        ]
+
+        done, merged = mcts100k.merge_root_stats(results)
+
+        self.assertEqual(done, 22)
+        self.assertEqual(merged, {20: (8, 3.5, None), 29: (8, 5.0, 1), 34: (6, 1.0, None)})
+
+    def test_best_move_parallel_prefers_proven(self):
+        my, opp, obs = opening()
+
+        def best_move(results):
+            pool = mock.Mock()
+            pool.map.return_value = results
+            budget = Budget(simulations=100)
+            with mock.patch.object(mcts100k, 'get_pool', return_value=pool):
+                action, _ = mcts100k.best_move_parallel(my, opp, obs, len(results), budget)
+            return action, budget.done
+
+        # A win proven by one worker beats visits; a proven loss is last.
+        results = [
+            (40, {20: (30, 15.0, None), 29: (3, 3.0, 1), 34: (6, 0.0, 0)}),
+            (50, {20: (20, 10.0, None), 34: (60, 20.0, None)}),
+        ]
+        self.assertEqual(best_move(results), (29, 90))
+
+        results[0][1].pop(29)
+        self.assertEqual(best_move(results), (20, 90))
+
+    def test_root_search_counts_simulations(self):
+        my, opp, obs = opening()
+        job = (my, opp, obs, 0, 300, None, mcts100k.Node.c_puct, mcts100k._settings())
+        results = [mcts100k._root_search(job[:3] + (seed,) + job[4:]) for seed in (1, 2)]
+
+        done, merged = mcts100k.merge_root_stats(results)
+
+        self.assertEqual(done, sum(worker_done for worker_done, _ in results))
+        self.assertLessEqual(done, 600)
+        # Every simulation but each worker's first, which expands the root,
+        # goes through a root child.
+        self.assertEqual(sum(N for N, _, _ in merged.values()), mcts_node.rollout_K * (done - len(results)))
+
+    def test_workers_get_settings(self):
+        my, opp, obs = opening()
+        pool = mock.Mock()
+        pool.map.return_value = [(1, {})]
+
+        with settings(rollout_K=4, rave=True, max_nodes=500):
+            with mock.patch.object(mcts100k, 'get_pool', return_value=pool):
+                mcts100k.best_move_parallel(my, opp, obs, 1, Budget(simulations=100))
+        (job,), = pool.map.call_args[0][1:]
+        *_, c_puct, worker_settings = job
+
+        self.assertEqual(c_puct, mcts100k.Node.c_puct)
+        self.assertEqual(worker_settings['rollout_K'], 4)
+        self.assertIs(worker_settings['rave'], True)
+        self.assertEqual(worker_settings['max_nodes'], 500)
+
+        # A worker applies them before searching.
+        worker_settings['rave'] = False
+        with settings(**worker_settings):
+            mcts_node.rollout_K = 1
+            done, edges = mcts100k._root_search((my, opp, obs, 1, 200, None, c_puct, worker_settings))
+            self.assertEqual(mcts_node.rollout_K, 4)
+        self.assertEqual(sum(N for N, _, _ in edges.values()), 4 * (done - 1))
+
+    def test_pool_startup_counts_against_budget(self):
+        my, opp, obs = opening()
+        pool = mock.Mock()
+        pool.map.return_value = [(1, {})]
+
+        def get_pool(processes):
+            time.sleep(0.3)
+            return pool
+
+        with mock.patch.object(mcts100k, 'get_pool', side_effect=get_pool):
+            mcts100k.best_move_parallel(my, opp, obs, 1, Budget(time_limit=0.5))
+        (job,), = pool.map.call_args[0][1:]
+        time_limit = job[5]
+
+        self.assertLessEqual(time_limit, 0.2)
+
+    def test_warm_up(self):
+        ready = queue.Queue()
+        mcts100k._warm_up(ready)
+        self.assertIsNone(ready.get_nowait())
+
+
+def check_statistics(test, node):
+    """Every expanded node has been visited once itself and once through
+    each child visit, with no virtual loss left, and Q = W / N."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.edges:
+            test.assertEqual(node.N, mcts_node.rollout_K + sum(child.N for child in node.edges.values()))
+        if node.N:
+            test.assertAlmostEqual(node.Q, node.W / node.N)
+            test.assertTrue(0 <= node.W <= node.N)
+        stack.extend(node.edges.values())
+
+
+class TreeParallelTests(unittest.TestCase):
+    def test_search_threaded(self):
+        my, opp, obs = opening()
+        root = mcts100k.Node(None, my, opp, obs, 0)
+        budget = Budget(simulations=3000)
+
+        done = mcts100k.search_threaded(root, 4, budget)
+
+        self.assertEqual(done, budget.done)
+        self.assertGreater(done, 1)
+        self.assertEqual(root.N, mcts_node.rollout_K * done)
+        self.assertEqual(root.size, count_nodes(root))
+        check_statistics(self, root)
+
+    def test_search_threaded_pruned(self):
+        with settings(max_nodes=300):
+            root = mcts100k.Node(None, *opening(), 0)
+            budget = Budget(simulations=5000)
+            mcts100k.search_threaded(root, 4, budget)
+
+            self.assertEqual(root.size, count_nodes(root))
+            # Threads finish the simulation they are in once the tree is full.
+            self.assertLessEqual(root.size, 300 + 2 * 4)
+            self.assertEqual(root.N, mcts_node.rollout_K * budget.done)
+
+    def test_size_of_taken_over_leaf(self):
+        # Another thread expands the child this one just created before it
+        # gets there, so this thread goes on to create a grandchild too.
+        root = mcts100k.Node(None, *opening(), 0)
+        root.leaf = False
+        child = mcts100k.Node.child
+
+        def taken_over(node, action):
+            new = child(node, action)
+            if node is root:
+                new.leaf = False
+            return new
+
+        with mock.patch.object(mcts100k.Node, 'child', taken_over):
+            mcts100k.simulate_threaded(root)
+
+        self.assertEqual(count_nodes(root), 3)
+        self.assertEqual(root.size, 3)
+        self.assertEqual(next(iter(root.edges.values())).size, 2)
+
+    def test_worker_error(self):
+        root = mcts100k.Node(None, *opening(), 0)
+
+        with mock.patch.object(mcts100k, 'simulate_threaded', side_effect=RuntimeError('failed')) as simulate:
+            with self.assertRaisesRegex(RuntimeError, 'failed'):
+                mcts100k.search_threaded(root, 4, Budget(simulations=1000))
+        # Each thread fails at most once; none is started again.
+        self.assertLessEqual(simulate.call_count, 4)
+
+    def test_lock_stripes_changed(self):
+        locks, lock_stripes = mcts100k._locks, mcts100k.lock_stripes
+        root = mcts100k.Node(None, *opening(), 0)
+        try:
+            mcts100k.lock_stripes = 4 * len(locks)
+            mcts100k.search_threaded(root, 2, Budget(simulations=200))
+
+            self.assertEqual(len(mcts100k._locks), 4 * len(locks))
+            self.assertEqual(root.size, count_nodes(root))
+        finally:
+            mcts100k._locks, mcts100k.lock_stripes = locks, lock_stripes
+
+
+if __name__ == '__main__':
+    unittest.main()
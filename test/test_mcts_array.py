@@ -0,0 +1,120 @@
+import time
+import unittest
+
+import numpy as np
+
+import engines.mcts100k as mcts100k
+import engines.mcts_array as mcts_array
+import game.bitboard as bitop
+from engines.budget import Budget
+from test.positions import find_position, has_moves, opening
+
+
+def winning_move(my, opp, obs):
+    """A move that ends the game with a win for the player making it, or
+    None."""
+    for i in bitop.bit_indices(bitop.generate_moves(my, opp, obs)).tolist():
+        new_my, new_opp = bitop.resolve_move(my, opp, i)
+        if bitop.is_terminated(new_opp, new_my, obs) and bitop.evaluate(new_my, new_opp, obs) > 0:
+            return i
+    return None
+
+
+def search_tree(my, opp, obs, simulations, capacity=1 << 12):
+    tree = mcts_array.Tree(capacity, mcts_array.c_puct)
+    tree.reset(np.uint64(my), np.uint64(opp), np.uint64(obs))
+    tree.search(simulations)
+    return tree
+
+
+def root_children(tree):
+    first = tree.first_child[0]
+    return range(first, first + tree.n_children[0])
+
+
+class MCTSArrayTests(unittest.TestCase):
+    def test_value_perspective(self):
+        # A move that wins on the spot is worth Q = 1 to the player who made
+        # it, in the array tree as in the Node engine.
+        my, opp, obs = find_position(lambda my, opp, obs: winning_move(my, opp, obs) is not None)
+        move = winning_move(my, opp, obs)
+
+        tree = search_tree(my, opp, obs, 500)
+        child = next(c for c in root_children(tree) if tree.move[c] == move)
+        self.assertGreater(tree.N[child], 0)
+        self.assertEqual(tree.W[child] / tree.N[child], 1)
+
+        root = mcts100k.Node(None, my, opp, obs, 0)
+        root.expand()
+        root.backup()
+        node = root.child(move)
+        node.expand()
+        node.backup(1)
+        self.assertEqual(node.Q, 1)
+
+    def test_pass_child(self):
+        my, opp, obs = find_position(lambda my, opp, obs: not bitop.generate_moves(my, opp, obs)
+                                     and bitop.generate_moves(opp, my, obs))
+
+        tree = search_tree(my, opp, obs, 10)
+        child = tree.first_child[0]
+        self.assertEqual(tree.n_children[0], 1)
+        self.assertEqual(tree.move[child], mcts_array.PASS)
+        self.assertEqual((tree.my[child], tree.opp[child]), (opp, my))
+        self.assertEqual(tree.best_move(), mcts_array.PASS)
+
+        root = mcts100k.Node(None, my, opp, obs, 0)
+        self.assertEqual(root.actions(), [mcts_array.PASS])
+        self.assertEqual((root.child(mcts_array.PASS).my, root.child(mcts_array.PASS).opp), (opp, my))
+
+    def test_capacity_exhaustion(self):
+        my, opp, obs = find_position(has_moves(4))
+        capacity = 50
+
+        tree = search_tree(my, opp, obs, 2000, capacity)
+
+        self.assertLessEqual(tree.size, capacity)
+        self.assertEqual(tree.N[0], 2000)
+        for node in range(tree.size):
+            if tree.n_children[node]:
+                first = tree.first_child[node]
+                children = tree.N[first:first + tree.n_children[node]]
+                self.assertEqual(tree.N[node], 1 + children.sum())
+
+    def test_forced_move(self):
+        my, opp, obs = find_position(lambda my, opp, obs: bitop.popcount(bitop.generate_moves(my, opp, obs)) == 1)
+        budget = Budget(simulations=100000)
+
+        tree = mcts_array.Tree(1 << 12, mcts_array.c_puct)
+        tree.reset(np.uint64(my), np.uint64(opp), np.uint64(obs))
+        mcts_array.search(tree, budget)
+
+        self.assertEqual(budget.done, 1)
+        self.assertEqual(tree.best_move(), bitop.bit_index(bitop.generate_moves(my, opp, obs)))
+
+    def test_time_budget(self):
+        my, opp, obs = opening()
+        budget = Budget(time_limit=0.2)
+
+        start = time.perf_counter()
+        move = mcts_array.run(my, opp, obs, budget)
+
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertGreater(budget.done, 1)
+        self.assertTrue(bitop.generate_moves(my, opp, obs) & (1 << move))
+
+    def test_settings_read_at_run(self):
+        my, opp, obs = opening()
+        saved = mcts_array.tree_capacity, mcts_array.c_puct
+        try:
+            mcts_array.tree_capacity, mcts_array.c_puct = 1 << 10, 0.5
+            mcts_array.run(my, opp, obs, Budget(simulations=100))
+
+            self.assertEqual(len(mcts_array.tree.N), 1 << 10)
+            self.assertEqual(mcts_array.tree.c_puct, 0.5)
+        finally:
+            mcts_array.tree_capacity, mcts_array.c_puct = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import game.hashing as hashing
+from engines.budget import Budget
+from engines.mcts_dag import Graph
+from test.positions import opening
+
+
+class GraphTests(unittest.TestCase):
+    def test_transpositions_share_nodes(self):
+        graph = Graph(*opening())
+
+        # Expand every line four plies deep, counting the paths to each node.
+        paths = {id(graph.root): 1}
+        frontier = [graph.root]
+        for _ in range(4):
+            next_frontier = {}
+            for node in frontier:
+                for action in node.actions():
+                    child = graph.child(node, action)
+                    paths[id(child)] = paths.get(id(child), 0) + paths[id(node)]
+                    next_frontier[id(child)] = child
+            frontier = list(next_frontier.values())
+
+        nodes = list(graph.table.values())
+        positions = {(node.my, node.opp, node.turn) for node in nodes}
+        self.assertEqual(len(positions), len(nodes))
+        self.assertTrue(any(paths[id(node)] > 1 for node in nodes))
+
+        for node in nodes:
+            self.assertEqual(node.key, hashing.hash_position(node.my, node.opp, node.obs, node.turn))
+
+    def test_edge_visits(self):
+        graph = Graph(*opening())
+        budget = Budget(simulations=3000)
+        graph.search(budget)
+        root = graph.root
+
+        self.assertEqual(root.N, budget.done)
+
+        incoming, parents = {}, {}
+        for node in graph.table.values():
+            for action, child in node.edges.items():
+                incoming[id(child)] = incoming.get(id(child), 0) + node.visits[action]
+                parents[id(child)] = parents.get(id(child), 0) + 1
+
+        # Every simulation through a node either stopped there, on its first
+        # visit or at the end of the game, or left it along one edge.
+        for node in graph.table.values():
+            if node.edges:
+                self.assertEqual(sum(node.visits.values()), node.N - 1)
+            if node is not root:
+                self.assertEqual(incoming.get(id(node), 0), node.N)
+        self.assertTrue(any(count > 1 for count in parents.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
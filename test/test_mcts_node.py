@@ -0,0 +1,290 @@
+import contextlib
+import unittest
+
+import numpy as np
+
+import engines.mcts as mcts
+import engines.mcts100k as mcts100k
+import engines.endgame as endgame
+import engines.mcts_node as mcts_node
+import game.bitboard as bitop
+from engines.budget import Budget
+from engines.mcts_node import Node
+from test.positions import endgame_positions, find_position, has_moves, opening
+
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(child) for child in node.edges.values())
+
+
+@contextlib.contextmanager
+def settings(**values):
+    """Set mcts_node module settings for the duration of a with block."""
+    saved = {name: getattr(mcts_node, name) for name in values}
+    for name, value in values.items():
+        setattr(mcts_node, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(mcts_node, name, value)
+
+
+class RolloutTests(unittest.TestCase):
+    def test_rollout_batch(self):
+        my, opp, obs = opening()
+
+        mcts100k._seed(5)
+        mean = mcts_node.rollout_batch(my, opp, obs, 64)
+        mcts100k._seed(5)
+        values = [mcts_node.rollout(my, opp, obs) for _ in range(64)]
+
+        self.assertAlmostEqual(mean, np.mean(values))
+
+    def test_rollout_batch_parallel(self):
+        my, opp, obs = opening()
+        mean = mcts_node.rollout_batch_parallel(my, opp, obs, 64)
+
+        self.assertTrue(0 <= mean <= 1)
+
+        # A full board, won by the player to move.
+        my, opp, obs = (1 << 48) - 1, ((1 << 64) - 1) ^ ((1 << 48) - 1), 0
+        for batch in (mcts_node.rollout_batch, mcts_node.rollout_batch_parallel):
+            self.assertEqual(batch(my, opp, obs, 16), 1.0)
+
+
+class BackupTests(unittest.TestCase):
+    def test_weighted_backup(self):
+        K = 8
+        with settings(rollout_K=K):
+            root = Node(None, *opening(), 0)
+            root.expand()
+            root.backup()
+
+            self.assertEqual(root.N, K)
+            self.assertAlmostEqual(root.W, K * (1 - root.V))
+
+            child = root.child(root.actions()[0])
+            child.expand()
+            child.backup(1)
+
+            self.assertEqual(child.N, K)
+            self.assertAlmostEqual(child.W, K * (1 - child.V))
+            self.assertEqual(root.N, 2 * K)
+            self.assertAlmostEqual(root.W, K * (1 - root.V) + K * child.V)
+            self.assertEqual(root.size, 2)
+
+    def test_weighted_search(self):
+        K = 4
+        with settings(rollout_K=K):
+            root = Node(None, *opening(), 0)
+            budget = Budget(simulations=200)
+            root.search(budget)
+
+            self.assertEqual(root.N, K * budget.done)
+            self.assertEqual(sum(child.N for child in root.edges.values()), K * (budget.done - 1))
+
+    def test_engine_settings(self):
+        root = mcts100k.Node(None, *opening(), 0)
+        child = root.child(root.actions()[0])
+
+        self.assertIs(type(child), mcts100k.Node)
+        self.assertEqual(child.c_puct, mcts100k.Node.c_puct)
+        self.assertNotEqual(mcts100k.Node.c_puct, mcts.Node.c_puct)
+
+
+class PruneTests(unittest.TestCase):
+    def test_max_nodes(self):
+        with settings(max_nodes=200):
+            root = Node(None, *opening(), 0)
+            for _ in range(3000):
+                root.simulate()
+                self.assertLessEqual(root.size, 200)
+
+            self.assertEqual(root.size, count_nodes(root))
+            self.assertEqual(root.N, 3000)
+
+    def test_prune(self):
+        with settings(max_nodes=None):
+            root = Node(None, *opening(), 0)
+            root.search(Budget(simulations=2000))
+            visits = {action: child.N for action, child in root.edges.items()}
+
+            root.prune(100)
+
+            self.assertLessEqual(root.size, 100)
+            self.assertEqual(root.size, count_nodes(root))
+            self.assertEqual({action: child.N for action, child in root.edges.items()}, visits)
+
+            # Collapsed nodes are expanded again when search reaches them.
+            root.search(Budget(simulations=500))
+            self.assertEqual(root.size, count_nodes(root))
+
+
+def expanded_root(N=4):
+    """An expanded root, with at least N moves, that has no children yet."""
+    root = Node(None, *find_position(has_moves(N)), 0)
+    root.expand()
+    root.backup()
+    return root
+
+
+class LazyChildTests(unittest.TestCase):
+    def test_unvisited_actions_selectable(self):
+        root = expanded_root()
+        actions = root.actions()
+        self.assertEqual(root.edges, {})
+
+        for action in actions[:2]:
+            child = root.child(action)
+            child.expand()
+            child.backup(1)
+            child.W = child.Q = 0
+
+        # Two visited moves that always lose leave only unvisited ones.
+        action = root.select()
+        self.assertIn(action, actions[2:])
+        self.assertNotIn(action, root.edges)
+
+        child = root.child(action)
+        self.assertIs(root.edges[action], child)
+        self.assertIs(root.child(action), child)
+        self.assertEqual(len(root.edges), 3)
+
+    def test_decided_and_best_action(self):
+        root = expanded_root()
+        self.assertIn(root.best_action(), root.actions())
+
+        action = root.actions()[-1]
+        child = root.child(action)
+        child.N = 100
+
+        self.assertEqual(root.best_action(), action)
+        self.assertTrue(root.decided(50))
+        self.assertFalse(root.decided(150))
+
+    def test_pass(self):
+        my, opp, obs = find_position(lambda my, opp, obs: not bitop.generate_moves(my, opp, obs)
+                                     and bitop.generate_moves(opp, my, obs))
+
+        root = Node(None, my, opp, obs, 0)
+        root.expand()
+        self.assertEqual(root.actions(), [mcts_node.PASS])
+        self.assertEqual(root.select(), mcts_node.PASS)
+
+        child = root.child(mcts_node.PASS)
+        self.assertEqual((child.my, child.opp, child.turn), (opp, my, 1))
+
+
+def outcome(diff):
+    return 1 if diff > 0 else 0.5 if diff == 0 else 0
+
+
+class SolverTests(unittest.TestCase):
+    def test_proven_matches_endgame(self):
+        positions = endgame_positions(6, 10)
+
+        for my, opp, obs in positions:
+            root = Node(None, my, opp, obs, 0)
+            root.search(Budget(simulations=50000))
+            _, expected = endgame.solve(my, opp, obs)
+
+            # proven is from the point of view of the player who moved into
+            # the root.
+            self.assertEqual(root.proven, 1 - outcome(expected))
+
+            move = root.best_action()
+            new_my, new_opp = bitop.resolve_move(my, opp, move)
+            _, reply = endgame.solve(new_opp, new_my, obs)
+            self.assertEqual(outcome(-reply), outcome(expected))
+            self.assertEqual(root.edges[move].proven, outcome(expected))
+
+        self.assertGreater(len(positions), 0)
+
+    def test_solved_children_skipped(self):
+        root = expanded_root(3)
+        first, second, *rest = root.actions()
+
+        drawn = root.child(first)
+        drawn.N, drawn.W, drawn.Q, drawn.proven = 10, 5, 0.5, 0.5
+        lost = root.child(second)
+        lost.N, lost.W, lost.Q, lost.proven = 10, 0, 0, 0
+
+        for _ in range(20):
+            self.assertIn(root.select(), rest)
+            root.simulate()
+        self.assertEqual((drawn.N, lost.N), (10, 10))
+
+        root.solve()
+        self.assertIsNone(root.proven)
+
+        for action in rest:
+            root.child(action).proven = 0
+        root.solve()
+        self.assertEqual(root.proven, 0.5)
+        self.assertEqual(root.best_action(), first)
+
+        won = root.child(rest[0])
+        won.proven = 1
+        root.solve()
+        self.assertEqual(root.proven, 0)
+        self.assertEqual(root.best_action(), rest[0])
+
+
+def credit(played, values):
+    """AMAF counts and value sums from crediting each value to the squares
+    of its played mask."""
+    N, W = np.zeros(8 * 8), np.zeros(8 * 8)
+    for bits, value in zip(played, values):
+        for i in bitop.bit_indices(np.uint64(bits)):
+            N[i] += 1
+            W[i] += value
+    return N, W
+
+
+class RaveTests(unittest.TestCase):
+    def test_backup_amaf(self):
+        with settings(rave=True, rollout_K=8):
+            root = Node(None, *opening(), 0)
+            root.expand()
+            values, mine, _ = root.playouts
+            root.backup()
+
+            expected_N, expected_W = credit(mine, values)
+            np.testing.assert_array_equal(root.amaf_N, expected_N)
+            np.testing.assert_allclose(root.amaf_W, expected_W)
+
+            # Expand a grandchild and check each node on its path.
+            a = root.actions()[0]
+            child = root.child(a)
+            child.expand()
+            child.backup(1)
+            b = child.actions()[0]
+            grandchild = child.child(b)
+            before = {id(node): (node.amaf_N.copy(), node.amaf_W.copy()) for node in (root, child)}
+
+            grandchild.expand()
+            values, mine, theirs = grandchild.playouts
+            grandchild.backup(1)
+            square_a, square_b = np.uint64(1) << np.uint64(a), np.uint64(1) << np.uint64(b)
+
+            N, W = credit(mine, values)
+            np.testing.assert_array_equal(grandchild.amaf_N, N)
+            np.testing.assert_allclose(grandchild.amaf_W, W)
+
+            # The child's mover played the grandchild's `theirs` squares and
+            # b, and scores 1 - value.
+            N, W = credit(theirs | square_b, 1 - values)
+            np.testing.assert_array_equal(child.amaf_N - before[id(child)][0], N)
+            np.testing.assert_allclose(child.amaf_W - before[id(child)][1], W)
+
+            # The root's mover is the grandchild's again, and also played a.
+            N, W = credit(mine | square_a, values)
+            np.testing.assert_array_equal(root.amaf_N - before[id(root)][0], N)
+            np.testing.assert_allclose(root.amaf_W - before[id(root)][1], W)
+            self.assertEqual(N[a], 8)
+            self.assertEqual(N[b], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
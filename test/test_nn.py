@@ -0,0 +1,131 @@
+import unittest
+
+from engines.budget import Budget
+import neural.nn as nn
+from neural.nn import Node
+from test.positions import find_position, has_moves, opening
+from test.test_quantized import random_fused
+
+
+def root_with_moves(N=4):
+    return Node(None, *find_position(has_moves(N)))
+
+
+class NodeTests(unittest.TestCase):
+    def setUp(self):
+        Node.c_puct = 0.05
+        Node.simul_N = 100
+        Node.batch_size = 1
+        Node.model = random_fused(0)
+
+    def test_lazy_children(self):
+        root = root_with_moves()
+        root.expand()
+        self.assertEqual(root.edges, {})
+
+        for _ in range(20):
+            root.simulate()
+
+        self.assertLessEqual(len(root.edges), len(root.actions()))
+        for action, child in root.edges.items():
+            self.assertIn(action, root.actions())
+            self.assertEqual(child.P, root.P_a[action])
+            self.assertEqual(child.turn, -root.turn)
+        self.assertEqual(root.N, 20)
+
+    def test_unvisited_actions_selectable(self):
+        root = root_with_moves()
+        root.expand()
+        actions = root.actions()
+
+        for action in actions[:2]:
+            child = root.child(action)
+            child.N, child.W, child.Q = 10, 0, 0
+        root.N = 20
+
+        action = root.select()
+        self.assertIn(action, actions[2:])
+        self.assertNotIn(action, root.edges)
+
+    def test_decided_and_best_action(self):
+        root = root_with_moves()
+        root.expand()
+        self.assertIn(root.best_action(), root.actions())
+
+        action = root.actions()[-1]
+        root.child(action).N = 100
+
+        self.assertEqual(root.best_action(), action)
+        self.assertTrue(root.decided(50))
+        self.assertFalse(root.decided(150))
+
+
+def nodes(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(node.edges.values())
+
+
+def check_statistics(test, root):
+    """A node's N counts the simulations that ended below it: at a child,
+    which was then expanded, or further down."""
+    for node in nodes(root):
+        if node.edges and not node.terminal:
+            test.assertEqual(node.N, sum(child.N + (not child.leaf) for child in node.edges.values()))
+        if node.N:
+            test.assertAlmostEqual(node.Q, node.W / node.N)
+
+
+class BatchedSearchTests(unittest.TestCase):
+    def setUp(self):
+        Node.c_puct = 0.05
+        Node.model = random_fused(0)
+
+    def test_virtual_loss_removed(self):
+        root = Node(None, *opening())
+        root.search_batched(Budget(simulations=50), 8)
+        before = {id(node): (node.N, node.W, node.Q) for node in nodes(root)}
+
+        leaves = root.select_leaves(8)
+        self.assertGreater(len(leaves), 1)
+
+        # Every pending path carries the virtual loss below the root.
+        added = sum(child.N - before.get(id(child), (0,))[0] for child in root.edges.values())
+        self.assertEqual(added, nn.virtual_loss * len(leaves))
+
+        for leaf in leaves:
+            leaf.add_virtual_loss(-nn.virtual_loss)
+        for node in nodes(root):
+            if id(node) in before:
+                self.assertEqual((node.N, node.W), before[id(node)][:2])
+                self.assertAlmostEqual(node.Q, before[id(node)][2])
+
+    def test_rounds_leave_consistent_statistics(self):
+        root = Node(None, *opening())
+
+        done = 0
+        for _ in range(20):
+            budget = Budget(simulations=8)
+            root.search_batched(budget, 8)
+            done += budget.done
+            check_statistics(self, root)
+
+        self.assertEqual(root.N, done - 1)
+
+    def test_batched_matches_search(self):
+        for batch_size in (1, 8):
+            root = Node(None, *opening())
+            budget = Budget(simulations=200)
+            if batch_size == 1:
+                root.search(budget)
+            else:
+                root.search_batched(budget, batch_size)
+
+            self.assertEqual(root.N, budget.done - 1)
+            check_statistics(self, root)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+import game.codec as codec
+import neural.fused as fused
+import neural.quantized as quantized
+from neural.fused import FusedCNN
+from neural.quantized import QuantizedCNN
+from test.test_bitboard import random_positions
+from test.test_fused import random_layers
+
+
+def random_fused(seed):
+    convs, dense = random_layers(np.random.default_rng(seed))
+    params = {'alpha': np.float32(0.3)}
+    for n, (kernel, bias, norm) in enumerate(convs):
+        params[f'conv{n}_kernel'], params[f'conv{n}_bias'] = fused.fold_batch_norm(kernel, bias, *norm, 1e-3)
+    for name, (kernel, bias) in dense.items():
+        params[f'{name}_kernel'], params[f'{name}_bias'] = kernel, bias
+    return FusedCNN({key: np.asarray(value, dtype=np.float32) for key, value in params.items()})
+
+
+def random_stored_positions(N):
+    my, opp, obs = random_positions(N)
+    return codec.positions_from_bits(my, opp, np.full(N, obs, dtype=np.uint64))
+
+
+class QuantizedTests(unittest.TestCase):
+    def test_quantize_per_channel(self):
+        kernel = np.random.default_rng(0).normal(size=(3, 3, 4, 5)).astype(np.float32)
+        q, scale = quantized.quantize_per_channel(kernel)
+
+        self.assertEqual(q.dtype, np.int8)
+        self.assertEqual(scale.shape, (5,))
+        self.assertEqual(np.abs(q).reshape(-1, 5).max(axis=0).tolist(), [127] * 5)
+        self.assertTrue(np.all(np.abs(q * scale - kernel) <= scale / 2 + 1e-7))
+
+    def test_calibrate(self):
+        model = random_fused(1)
+        positions = random_stored_positions(64)
+        ranges = quantized.calibrate(model, positions, batch_size=16)
+
+        self.assertEqual(set(ranges), {'conv0', 'conv1', 'conv2', 'conv3', 'conv4', 'conv5', 'conv6',
+                                       'policy', 'value_hidden', 'value'})
+        self.assertEqual(ranges['conv0'], 1.0)
+
+    def test_drift(self):
+        model = random_fused(2)
+        positions = random_stored_positions(400)
+        calibration, held_out = positions[:200], positions[200:]
+
+        half = QuantizedCNN.from_fused(model, 'float16')
+        report = quantized.drift(model, half, held_out)
+        self.assertLess(report['policy_max'], 0.1)
+        self.assertLess(report['value_max'], 0.01)
+
+        int8 = QuantizedCNN.from_fused(model, 'int8', calibration)
+        self.assertEqual(int8.params['conv1_kernel'].dtype, np.int8)
+        report = quantized.drift(model, int8, held_out)
+        self.assertLess(report['policy_mean'], 0.1)
+        self.assertLess(report['value_mean'], 0.02)
+        self.assertGreater(report['policy_top1'], 0.85)
+
+    def test_kernels_widened_once(self):
+        model = random_fused(3)
+        positions = random_stored_positions(100)
+
+        for mode in quantized.MODES:
+            q = QuantizedCNN.from_fused(model, mode, positions)
+            stored, runtime = quantized.weight_bytes(q)
+            widened = sum(kernel.nbytes for kernel in q.kernels.values())
+
+            self.assertEqual(set(q.kernels), {key[:-len('_kernel')] for key in q.params if key.endswith('_kernel')})
+            for name, kernel in q.kernels.items():
+                self.assertEqual(kernel.dtype, np.float32)
+                np.testing.assert_array_equal(kernel, q.params[f'{name}_kernel'])
+            self.assertLess(stored, quantized.weight_bytes(model)[0])
+            self.assertEqual(runtime, stored + widened)
+
+            # A model built from stored parameters widens them too.
+            copy = QuantizedCNN(mode, dict(q.params))
+            batch = list(zip(positions['my'], positions['opp'], positions['obs']))
+            np.testing.assert_array_equal(copy.eval_batch(batch)[0], q.eval_batch(batch)[0])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            QuantizedCNN('int4')
+
+
+if __name__ == '__main__':
+    unittest.main()
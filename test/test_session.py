@@ -0,0 +1,120 @@
+import time
+import unittest
+from unittest import mock
+
+import engines.mcts as mcts
+import game.bitboard as bitop
+from engines.budget import Budget
+from engines.session import Session
+from test.positions import opening
+
+
+class SessionTests(unittest.TestCase):
+    def test_notify_move_reuses_child(self):
+        session = Session(mcts, ponder=False)
+        session.new_game(*opening())
+        root = session.root
+
+        move = session.think(Budget(simulations=200))
+        child = root.edges[move]
+        N = child.N
+        session.notify_move(move)
+
+        self.assertIs(session.root, child)
+        self.assertIsNone(child.parent)
+        self.assertEqual(child.N, N)
+        self.assertGreater(N, 0)
+
+    def test_notify_move_unexplored(self):
+        session = Session(mcts, ponder=False)
+        my, opp, obs = opening()
+        session.new_game(my, opp, obs)
+
+        move = bitop.bit_index(bitop.generate_moves(my, opp, obs))
+        session.notify_move(move)
+
+        new_my, new_opp = bitop.resolve_move(my, opp, move)
+        root = session.root
+        self.assertEqual((root.my, root.opp, root.obs), (new_opp, new_my, obs))
+        self.assertEqual(root.turn, 1)
+        self.assertEqual(root.N, 0)
+
+    def test_find(self):
+        session = Session(mcts, ponder=False)
+        my, opp, obs = opening()
+        session.new_game(my, opp, obs)
+        session.root.search(Budget(simulations=300))
+
+        root = session.root
+        child = max(root.edges.values(), key=lambda node: node.N)
+        grandchild = max(child.edges.values(), key=lambda node: node.N)
+
+        self.assertIs(session._find(my, opp, obs), root)
+        self.assertIs(session._find(child.my, child.opp, obs), child)
+        self.assertIs(session._find(grandchild.my, grandchild.opp, obs), grandchild)
+        self.assertIsNone(session._find(my, opp, obs ^ 1))
+        self.assertIsNone(session._find(opp, my, obs))
+
+    def test_run_reuses_tree(self):
+        session = Session(mcts, ponder=False)
+        my, opp, obs = opening()
+
+        move = session.run(my, opp, obs, Budget(simulations=300))
+        my, opp = bitop.resolve_move(my, opp, move)
+        reply = max(session.root.edges, key=lambda a: session.root.edges[a].N)
+        node = session.root.edges[reply]
+        opp, my = bitop.resolve_move(opp, my, reply)
+
+        session.run(my, opp, obs, Budget(simulations=1))
+        self.assertIs(session.root.parent, None)
+        self.assertIn(session.root, node.edges.values())
+
+    def test_pondering(self):
+        session = Session(mcts, ponder=True)
+        my, opp, obs = opening()
+        session.new_game(my, opp, obs)
+
+        session.notify_move(bitop.bit_index(bitop.generate_moves(my, opp, obs)))
+        self.assertIsNotNone(session._thread)
+        time.sleep(0.5)
+        session._stop_pondering()
+
+        self.assertIsNone(session._thread)
+        N = session.root.N
+        self.assertGreater(N, 0)
+        time.sleep(0.1)
+        self.assertEqual(session.root.N, N)
+
+        session.notify_move(session.root.actions()[0])
+        self.assertIsNotNone(session._thread)
+        session.think(Budget(simulations=10))
+        self.assertIsNone(session._thread)
+
+    def test_run_stops_pondering_before_find(self):
+        session = Session(mcts, ponder=True)
+        my, opp, obs = opening()
+
+        move = session.run(my, opp, obs, Budget(simulations=100))
+        self.assertIsNotNone(session._thread)
+        time.sleep(0.2)
+
+        threads = []
+        find = session._find
+
+        def checked_find(*position):
+            threads.append(session._thread)
+            return find(*position)
+
+        my, opp = bitop.resolve_move(my, opp, move)
+        reply = session.root.actions()[0]
+        opp, my = bitop.resolve_move(opp, my, reply)
+        with mock.patch.object(session, '_find', side_effect=checked_find):
+            session.run(my, opp, obs, Budget(simulations=100))
+
+        self.assertEqual(threads, [None])
+        self.assertIsNotNone(session._thread)
+        session._stop_pondering()
+
+
+if __name__ == '__main__':
+    unittest.main()